@@ -0,0 +1,187 @@
+import asyncio
+import os
+import random
+import time
+
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+
+from .generator import DiagramGenerator, load_env
+from .metrics import metrics
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, bursting up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self, tokens=1):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+class BatchResult:
+    def __init__(self, index, description, diagram=None, error=None, attempts=0):
+        self.index = index
+        self.description = description
+        self.diagram = diagram
+        self.error = error
+        self.attempts = attempts
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"<BatchResult {self.index} {status} attempts={self.attempts}>"
+
+
+class BatchGenerator:
+    """
+    Generate many diagrams concurrently with the async OpenAI client.
+
+    At most `concurrency` requests are in flight, `requests_per_second` (if set)
+    throttles request starts through a token bucket, and 429/5xx/connection
+    errors are retried with full-jitter exponential backoff. Responses go through
+    the wrapped DiagramGenerator's prompt and cache, so cached descriptions never
+    reach the network. Pass base_url to point the client at a stub server.
+    """
+
+    def __init__(
+        self,
+        generator=None,
+        client=None,
+        concurrency=8,
+        requests_per_second=None,
+        max_retries=5,
+        base_delay=1.0,
+        max_delay=30.0,
+        base_url=None,
+    ):
+        self.generator = generator if generator is not None else DiagramGenerator()
+        if client is None:
+            # Retries are handled here so backoff is shared with the throttle
+            load_env()
+            client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url, max_retries=0
+            )
+        self.client = client
+        self.concurrency = concurrency
+        self.bucket = None
+        if requests_per_second:
+            self.bucket = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def complete(self, messages, model=None):
+        """Return (content, attempts) for one completion, retrying transient errors."""
+        model = model or self.generator.model
+        cache = self.generator.cache
+        with metrics.stage("generate", model=model, cache_hit=False) as event:
+            key = self.generator.cache_key(model, messages)
+            if key is not None:
+                content = cache.get(key)
+                if content is not None:
+                    event["cache_hit"] = True
+                    return content, 0
+
+            attempt = 0
+            while True:
+                attempt += 1
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=model, messages=messages
+                    )
+                    break
+                except (APIStatusError, APIConnectionError) as e:
+                    if attempt > self.max_retries or not self._is_retryable(e):
+                        raise
+                    await asyncio.sleep(self._backoff(attempt, e))
+                finally:
+                    event["attempts"] = attempt
+
+            content = response.choices[0].message.content
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                event["prompt_tokens"] = usage.prompt_tokens
+                event["completion_tokens"] = usage.completion_tokens
+            if key is not None:
+                cache.put(key, model, content)
+            return content, attempt
+
+    async def generate(self, description):
+        content, _ = await self.complete(self.generator.build_messages(description))
+        return content
+
+    async def generate_many(self, descriptions):
+        """Yield a BatchResult for each description as soon as it completes."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(index, description):
+            result = BatchResult(index, description)
+            start = time.perf_counter()
+            async with semaphore:
+                try:
+                    messages = self.generator.build_messages(description)
+                    result.diagram, result.attempts = await self.complete(messages)
+                except Exception as e:
+                    result.error = e
+            result.elapsed = time.perf_counter() - start
+            return result
+
+        tasks = [
+            asyncio.ensure_future(run(index, description))
+            for index, description in enumerate(descriptions)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, APIConnectionError):
+            return True
+        return error.status_code == 429 or error.status_code >= 500
+
+    def _backoff(self, attempt, error):
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(self.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, delay)
+
+
+async def generate_many(descriptions, **kwargs):
+    """Shortcut for BatchGenerator(**kwargs).generate_many(descriptions)."""
+    async for result in BatchGenerator(**kwargs).generate_many(descriptions):
+        yield result
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .cache import RenderCache
+from .engine import RenderTimeout
+from .layout import STRATEGIES
+from .model import Diagram
+from .parser import DiagramError, parse_diagram, validate_diagram
+from .visualiser import DiagramVisualiser
+
+
+def _load_diagram(source):
+    if isinstance(source, dict):
+        issues = validate_diagram(source)
+        if issues:
+            raise DiagramError(issues, source)
+        return Diagram.from_dict(source)
+    if os.path.isfile(source):
+        with open(source, encoding="utf-8") as f:
+            source = f.read()
+    # A JSON file, or raw generator output possibly wrapped in prose
+    return Diagram.from_dict(parse_diagram(source))
+
+
+# One render cache per worker process, so icon hashes are reused across diagrams
+_render_caches = {}
+
+
+def _render_cache(cache_dir):
+    if cache_dir is None:
+        return None
+    if cache_dir not in _render_caches:
+        _render_caches[cache_dir] = RenderCache(cache_dir)
+    return _render_caches[cache_dir]
+
+
+def render_one(
+    name,
+    source,
+    output_base,
+    format,
+    timeout,
+    image_directory,
+    cache_dir=None,
+    layout="auto",
+):
+    """Render one diagram, returning its manifest entry instead of raising."""
+    cache = _render_cache(cache_dir)
+    hits = cache.hits if cache is not None else 0
+    entry = {
+        "name": name,
+        "input": source if isinstance(source, str) and os.path.isfile(source) else None,
+        "output": None,
+        "outputs": {},
+        "status": "ok",
+        "seconds": 0.0,
+        "cached": False,
+        "error": None,
+    }
+    start = time.perf_counter()
+    try:
+        visualiser = DiagramVisualiser(
+            _load_diagram(source), image_directory, cache, layout
+        )
+        formats = format.split(",")
+        entry["outputs"] = visualiser.render_formats(output_base, formats, timeout)
+        entry["output"] = entry["outputs"][formats[0]]
+        entry["cached"] = cache is not None and cache.hits > hits
+    except RenderTimeout as e:
+        entry["status"] = "timeout"
+        entry["error"] = str(e)
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["seconds"] = round(time.perf_counter() - start, 4)
+    return entry
+
+
+def _named(diagrams):
+    used = set()
+    for index, source in enumerate(diagrams):
+        if isinstance(source, str) and os.path.isfile(source):
+            name = os.path.splitext(os.path.basename(source))[0]
+        else:
+            name = f"diagram-{index}"
+        while name in used:
+            name = f"{name}-{index}"
+        used.add(name)
+        yield name, source
+
+
+def render_many(
+    diagrams,
+    output_dir,
+    format="png",
+    workers=None,
+    timeout=120,
+    image_directory="images",
+    manifest="manifest.json",
+    cache_dir=None,
+    layout="auto",
+):
+    """
+    Render many diagrams headlessly across a process pool.
+
+    diagrams may mix JSON file paths, parsed diagram dicts and raw generator
+    output strings. Each diagram gets its own layout engine process bounded by
+    timeout seconds; a failure is recorded in its manifest entry and does not
+    stop the batch. With cache_dir set, diagrams whose DOT source and icons
+    are unchanged are copied from a RenderCache there instead of laid out.
+    layout picks the layout strategy for every diagram; "auto" sizes each.
+    format may list several formats ("png,svg,pdf"), all written from one
+    layout of each diagram; "output" is then the first and "outputs" has all.
+    The manifest is written to output_dir and returned.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    entries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (
+                name,
+                pool.submit(
+                    render_one,
+                    name,
+                    source,
+                    os.path.join(output_dir, name),
+                    format,
+                    timeout,
+                    image_directory,
+                    cache_dir,
+                    layout,
+                ),
+            )
+            for name, source in _named(diagrams)
+        ]
+        for name, future in futures:
+            try:
+                entries.append(future.result())
+            except Exception as e:  # e.g. a worker process died
+                entries.append(
+                    {
+                        "name": name,
+                        "input": None,
+                        "output": None,
+                        "outputs": {},
+                        "status": "error",
+                        "seconds": None,
+                        "cached": False,
+                        "error": f"{type(e).__name__}: {e}",
+                    }
+                )
+
+    result = {
+        "format": format,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - start, 4),
+        "rendered": sum(entry["status"] == "ok" for entry in entries),
+        "failed": sum(entry["status"] != "ok" for entry in entries),
+        "cached": sum(entry["cached"] for entry in entries),
+        "diagrams": entries,
+    }
+    if manifest:
+        with open(os.path.join(output_dir, manifest), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render diagram JSON files headlessly in parallel."
+    )
+    parser.add_argument("inputs", nargs="+", help="Diagram JSON files")
+    parser.add_argument("-o", "--output-dir", default="rendered")
+    parser.add_argument(
+        "-f", "--format", default="png", help="Format, or several: png,svg,pdf"
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=120, help="Seconds per diagram"
+    )
+    parser.add_argument("--images", default="images", help="Image directory")
+    parser.add_argument(
+        "--cache-dir",
+        default=os.getenv("AI_ARCHITECT_RENDER_CACHE_DIR"),
+        help="Render cache directory (skips unchanged diagrams)",
+    )
+    parser.add_argument(
+        "--layout", default="auto", choices=["auto", *STRATEGIES], help="Layout"
+    )
+    args = parser.parse_args()
+
+    result = render_many(
+        args.inputs,
+        args.output_dir,
+        format=args.format,
+        workers=args.workers,
+        timeout=args.timeout,
+        image_directory=args.images,
+        cache_dir=args.cache_dir,
+        layout=args.layout,
+    )
+    for entry in result["diagrams"]:
+        detail = entry["output"] if entry["status"] == "ok" else entry["error"]
+        print(f"{entry['status']:>7}  {entry['name']}: {detail}")
+    print(
+        f"Rendered {result['rendered']} of {len(result['diagrams'])} diagrams "
+        f"({result['cached']} from cache) in {result['seconds']:.2f}s "
+        f"with {result['workers']} workers."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class CacheMissError(LookupError):
+    """Raised by a replay-only cache when a request has no recorded response."""
+
+
+class DiskCache:
+    """
+    Content-addressed file cache with LRU eviction.
+
+    Entries live in <directory>/<key[:2]>/<key><suffix> and are written through
+    a temp file and os.replace, so readers in other processes never see partial
+    data. A hit refreshes the entry's mtime, which doubles as its last-used time
+    for both the size cap (least recently used first) and the age limit.
+    Eviction runs under an exclusive lock on <directory>/.lock.
+    """
+
+    suffix = ""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age  # seconds since last use, or None to keep forever
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get_bytes(self, key):
+        path = self._fresh_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self._touch(path)
+        self.hits += 1
+        return data
+
+    def copy_to(self, key, destination):
+        """Copy a stored entry to destination; return False on a miss."""
+        path = self._fresh_path(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, destination)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self._touch(path)
+        self.hits += 1
+        return True
+
+    def put_bytes(self, key, data):
+        def write(f):
+            f.write(data)
+
+        return self._put(key, write)
+
+    def put_file(self, key, source):
+        def write(f):
+            with open(source, "rb") as src:
+                shutil.copyfileobj(src, f)
+
+        return self._put(key, write)
+
+    def _put(self, key, write):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+        return path
+
+    def _fresh_path(self, key):
+        # Path of a live entry for key, or None (counted as a miss)
+        path = self.path(key)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        if self.max_age is not None and time.time() - mtime > self.max_age:
+            self._remove(path)
+            self.misses += 1
+            return None
+        return path
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        """Yield (path, size, mtime) for every stored entry."""
+        with os.scandir(self.directory) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.endswith(".tmp"):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        with self._lock():
+            now = time.time()
+            entries = []
+            for path, size, mtime in self.entries():
+                if self.max_age is not None and now - mtime > self.max_age:
+                    self._remove(path)
+                else:
+                    entries.append((mtime, size, path))
+
+            total = sum(size for _, size, _ in entries)
+            if self.max_bytes is None or total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        with self._lock():
+            for path, _, _ in list(self.entries()):
+                self._remove(path)
+
+    @contextmanager
+    def _lock(self):
+        with open(os.path.join(self.directory, ".lock"), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ResponseCache(DiskCache):
+    """
+    Persistent cache of chat completions, keyed on model, messages and image catalog.
+
+    With replay_only=True a miss raises CacheMissError instead of letting the
+    caller fall through to the API, which keeps CI and benchmark runs offline.
+    """
+
+    suffix = ".json"
+
+    def __init__(self, directory, replay_only=False, **kwargs):
+        super().__init__(directory, **kwargs)
+        self.replay_only = replay_only
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from AI_ARCHITECT_CACHE_* variables, or None if unset."""
+        directory = os.getenv("AI_ARCHITECT_CACHE_DIR")
+        if not directory:
+            return None
+        max_bytes = os.getenv("AI_ARCHITECT_CACHE_MAX_BYTES")
+        max_age = os.getenv("AI_ARCHITECT_CACHE_MAX_AGE")
+        return cls(
+            directory,
+            replay_only=os.getenv("AI_ARCHITECT_CACHE_REPLAY", "").lower()
+            in ("1", "true", "yes"),
+            max_bytes=int(max_bytes) if max_bytes else 256 * 1024 * 1024,
+            max_age=float(max_age) if max_age else None,
+        )
+
+    @staticmethod
+    def key(model, messages, catalog):
+        payload = json.dumps(
+            {"model": model, "messages": messages, "catalog": sorted(catalog)},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        data = self.get_bytes(key)
+        if data is None:
+            if self.replay_only:
+                raise CacheMissError(
+                    f"No cached response for {key} in replay-only mode"
+                )
+            return None
+        return json.loads(data)["content"]
+
+    def put(self, key, model, content):
+        record = {"model": model, "content": content, "created": time.time()}
+        return self.put_bytes(key, json.dumps(record).encode("utf-8"))
+
+
+class RenderCache(DiskCache):
+    """
+    Cache of rendered diagram images, keyed on the DOT source that produced them.
+
+    The key hashes the canonicalised DOT source, the output format and the
+    contents of every icon file the source references, so editing an icon
+    invalidates the diagrams that use it while unchanged diagrams are served
+    by copying the stored artifact.
+    """
+
+    _ICON_REFERENCE = re.compile(r'(?:SRC|image)="([^"]+)"')
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(directory, **kwargs)
+        self._icon_hashes = {}
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from AI_ARCHITECT_RENDER_CACHE_* variables, or None."""
+        directory = os.getenv("AI_ARCHITECT_RENDER_CACHE_DIR")
+        if not directory:
+            return None
+        max_bytes = os.getenv("AI_ARCHITECT_RENDER_CACHE_MAX_BYTES")
+        return cls(
+            directory,
+            max_bytes=int(max_bytes) if max_bytes else 256 * 1024 * 1024,
+        )
+
+    _STRING_END = re.compile(r'(?:[^"\\]|\\.)*"')
+    _HTML_BRACKET = re.compile(r"[<>]")
+    _OPENING = re.compile(r'["<]')
+
+    @classmethod
+    def canonical_source(cls, source):
+        # Whole-line comments and indentation do not change the rendered
+        # image; inside a quoted string or HTML label every character counts
+        lines = []
+        quoted = False
+        depth = 0  # of <...> nesting in an HTML label
+        for line in source.splitlines():
+            if not (quoted or depth):
+                line = line.lstrip()
+                if not line or line.startswith("//"):
+                    continue
+            pos = 0
+            while True:
+                if quoted:
+                    match = cls._STRING_END.match(line, pos)
+                    if match is None:
+                        break
+                    quoted = False
+                elif depth:
+                    match = cls._HTML_BRACKET.search(line, pos)
+                    if match is None:
+                        break
+                    depth += 1 if match.group() == "<" else -1
+                else:
+                    match = cls._OPENING.search(line, pos)
+                    if match is None:
+                        break
+                    if match.group() == '"':
+                        quoted = True
+                    else:
+                        depth = 1
+                pos = match.end()
+            if not (quoted or depth):
+                line = line.rstrip()
+            lines.append(line)
+        return "\n".join(lines)
+
+    def key(self, source, format):
+        digest = hashlib.sha256()
+        digest.update(format.encode("utf-8") + b"\0")
+        digest.update(self.canonical_source(source).encode("utf-8"))
+        for icon in sorted(set(self._ICON_REFERENCE.findall(source))):
+            digest.update(b"\0" + icon.encode("utf-8") + b"=" + self.icon_hash(icon))
+        return digest.hexdigest()
+
+    def icon_hash(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return b"missing"
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._icon_hashes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with open(path, "rb") as f:
+            value = hashlib.sha256(f.read()).digest()
+        self._icon_hashes[path] = (signature, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
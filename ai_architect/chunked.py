@@ -0,0 +1,271 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import metrics
+from .parser import DiagramError, extract_diagram, validate_diagram
+
+SECTION_PROMPT = """This is section {index} of {count} of a longer system description.
+The whole system: {overview}
+
+Diagram only what this section describes. Connections may name components
+described in other sections; use the names those sections would use.
+
+{section}"""
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize(name):
+    """Name key for merging: case, spacing and punctuation are ignored."""
+    return " ".join(_WORD.findall(str(name).lower()))
+
+
+def _is_name(value):
+    # Other values are left for validation to report
+    return isinstance(value, str) and bool(value)
+
+
+def _same_type(a, b):
+    # A missing type matches any type
+    return not a or not b or normalize(a) == normalize(b)
+
+
+def split_sections(description, max_words=400):
+    """
+    Split description into sections of at most about max_words words.
+
+    Paragraphs (blocks separated by blank lines) are kept together and packed
+    greedily; a paragraph longer than max_words is split between lines.
+    """
+    blocks = []
+    for block in re.split(r"\n\s*\n", description.strip()):
+        if len(block.split()) <= max_words:
+            blocks.append(block)
+            continue
+        lines = []
+        for line in block.splitlines():
+            lines.append(line)
+            if len(" ".join(lines).split()) >= max_words:
+                blocks.append("\n".join(lines))
+                lines = []
+        if lines:
+            blocks.append("\n".join(lines))
+
+    sections = []
+    current, words = [], 0
+    for block in blocks:
+        size = len(block.split())
+        if current and words + size > max_words:
+            sections.append("\n\n".join(current))
+            current, words = [], 0
+        current.append(block)
+        words += size
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+class MergeReport:
+    def __init__(self):
+        self.duplicates = 0  # components merged into one seen in another section
+        self.renamed = []  # (section, name, new name): same name, other type
+        self.reconciled = 0  # connections resolved to another section's node
+        self.dropped = []  # (section, connection) with an unknown endpoint
+        self.clashes = []  # names of both a group and a component
+
+    def __repr__(self):
+        return (
+            f"<MergeReport duplicates={self.duplicates} "
+            f"renamed={len(self.renamed)} reconciled={self.reconciled} "
+            f"dropped={len(self.dropped)} clashes={len(self.clashes)}>"
+        )
+
+
+def merge_diagrams(parts):
+    """
+    Merge partial diagrams into one diagram in the same schema.
+
+    Groups are merged by normalized name. A component is the same as one
+    from an earlier part when their normalized names match and their types
+    match, or either has no type; the first occurrence is kept and missing
+    fields are filled from later ones. A same-named component of another
+    type is kept under a "name (type)" name. Connection endpoints are first
+    resolved within their own part, exactly and then by normalized name,
+    then across all parts by normalized name, where a component wins over
+    a group of the same name (listed in MergeReport.clashes). Connections
+    still unresolved are dropped, and duplicates removed.
+
+    Returns (diagram, MergeReport).
+    """
+    report = MergeReport()
+    groups = {}  # normalized name -> group
+    components = []
+    by_name = {}  # normalized name -> components with that name
+    names = set()
+    aliases = []  # per part: {local name: merged name}
+    local_keys = []  # per part: {normalized local name: merged name}
+
+    def group_name(name):
+        key = normalize(name)
+        if key not in groups:
+            groups[key] = {"name": name}
+        return groups[key]["name"]
+
+    for part in parts:
+        for group in part.get("groups") or ():
+            if isinstance(group, dict) and _is_name(group.get("name")):
+                merged = groups.setdefault(normalize(group["name"]), dict(group))
+                for field, value in group.items():
+                    merged.setdefault(field, value)
+
+    for index, part in enumerate(parts):
+        local = {}
+        for component in part.get("components") or ():
+            if not isinstance(component, dict) or not _is_name(component.get("name")):
+                continue
+            name, key = component["name"], normalize(component["name"])
+            existing = next(
+                (
+                    other
+                    for other in by_name.get(key, ())
+                    if _same_type(component.get("type"), other.get("type"))
+                ),
+                None,
+            )
+            if existing is not None:
+                report.duplicates += 1
+                for field, value in component.items():
+                    if value and not existing.get(field):
+                        existing[field] = value
+                local[name] = existing["name"]
+                continue
+            merged = dict(component)
+            if merged["name"] in names:
+                merged["name"] = f"{name} ({component.get('type')})"
+                report.renamed.append((index, name, merged["name"]))
+            names.add(merged["name"])
+            components.append(merged)
+            by_name.setdefault(key, []).append(merged)
+            local[name] = merged["name"]
+        aliases.append(local)
+        keys = {}
+        for name, merged_name in local.items():
+            keys.setdefault(normalize(name), merged_name)
+        local_keys.append(keys)
+
+    for component in components:
+        if _is_name(component.get("group")):
+            component["group"] = group_name(component["group"])
+
+    # Cross-part resolution; a name shared by components of several types
+    # resolves to the first of them, and one shared by a group and a
+    # component to the component
+    resolved = {key: group["name"] for key, group in groups.items()}
+    report.clashes = sorted(resolved[key] for key in by_name if key in resolved)
+    resolved.update((key, found[0]["name"]) for key, found in by_name.items())
+
+    connections = []
+    seen = set()
+    for index, part in enumerate(parts):
+        for connection in part.get("connections") or ():
+            if not isinstance(connection, dict):
+                continue
+            ends = []
+            for end in ("from", "to"):
+                name = connection.get(end)
+                if not _is_name(name):
+                    ends.append(None)
+                    continue
+                if name in aliases[index]:
+                    ends.append(aliases[index][name])
+                    continue
+                key = normalize(name)
+                if key in local_keys[index]:
+                    ends.append(local_keys[index][key])
+                    continue
+                ends.append(resolved.get(key))
+                if ends[-1] is not None and key in by_name:
+                    report.reconciled += 1
+            if None in ends:
+                report.dropped.append((index, connection))
+                continue
+            key = (ends[0], ends[1], normalize(connection.get("label") or ""))
+            if key in seen:
+                continue
+            seen.add(key)
+            connections.append({**connection, "from": ends[0], "to": ends[1]})
+
+    diagram = {
+        "groups": list(groups.values()),
+        "components": components,
+        "connections": connections,
+    }
+    return diagram, report
+
+
+class ChunkedGenerator:
+    """
+    Map-reduce generation for descriptions too long for one good completion.
+
+    The description is split into sections (split_sections), a partial
+    diagram is generated for each section concurrently through the wrapped
+    DiagramGenerator, so its cache, client and metrics are shared, and the
+    parts are merged locally (merge_diagrams). Descriptions that fit in one
+    section take the generator's usual path.
+    """
+
+    def __init__(self, generator, max_words=400, concurrency=4):
+        self.generator = generator
+        self.max_words = max_words
+        self.concurrency = concurrency
+
+    def section_prompts(self, description):
+        sections = split_sections(description, self.max_words)
+        overview = " ".join(sections[0].split("\n\n")[0].split())
+        return [
+            SECTION_PROMPT.format(
+                index=index,
+                count=len(sections),
+                overview=overview,
+                section=section,
+            )
+            for index, section in enumerate(sections, 1)
+        ]
+
+    def generate_part(self, prompt):
+        # Partial diagrams may name nodes of other sections: no validation
+        text = self.generator.generate_diagram(prompt)
+        try:
+            return extract_diagram(text)
+        except DiagramError as e:
+            if e.diagram is None:
+                raise
+            return e.diagram
+
+    def generate(self, description, retries=1):
+        """
+        Return (diagram, MergeReport) for description; the report is None
+        when the description fits in one section.
+
+        Problems left after merging are fixed with up to `retries` patch
+        requests (see DiagramGenerator.fix_diagram).
+        """
+        prompts = self.section_prompts(description)
+        if len(prompts) == 1:
+            diagram = self.generator.generate_valid_diagram(description, retries)
+            return diagram, None
+        with metrics.stage("chunked", sections=len(prompts)) as event:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                parts = list(pool.map(self.generate_part, prompts))
+            diagram, report = merge_diagrams(parts)
+            event["duplicates"] = report.duplicates
+            event["reconciled"] = report.reconciled
+            event["dropped"] = len(report.dropped)
+            event["clashes"] = len(report.clashes)
+            event["components"] = len(diagram["components"])
+        issues = validate_diagram(diagram)
+        if issues:
+            if not retries:
+                raise DiagramError(issues, diagram)
+            diagram = self.generator.fix_diagram(diagram, issues, retries)
+        return diagram, report
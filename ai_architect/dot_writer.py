@@ -0,0 +1,171 @@
+import time
+
+from .image_index import get_image_index
+from .layout import get_strategy
+from .metrics import metrics
+
+# Lines gathered before a chunk is handed to the consumer
+CHUNK_LINES = 1000
+
+# Node size in inches: an 80x80 pixel icon cell with the name below it
+ICON_WIDTH = "1.2"
+ICON_HEIGHT = "1.45"
+TEXT_HEIGHT = "0.3"
+
+
+def quote(value):
+    """Quote value as a DOT string."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _attrs(**attrs):
+    return " ".join(f"{key}={quote(value)}" for key, value in attrs.items())
+
+
+class DotWriter:
+    """
+    Streams DOT for a diagram without building a graphviz.Digraph.
+
+    Components and connections may be any iterables, including generators,
+    of JSON objects or model objects (see model.py), and are consumed once;
+    only the set of open group names is kept. Nodes use graphviz's own image=
+    attribute instead of an HTML table per node, and the icon is set as a
+    node default, by filename relative to the graph's imagepath, only when it
+    changes from one node to the next, so each node costs one short line: its
+    quoted name, which is also its label. An icon therefore gets one default
+    per run of nodes using it, not one per distinct icon: grouping nodes by
+    icon would mean holding them all. A group's cluster is reopened by name
+    whenever its components are not contiguous. Defaults are reset before
+    the connections, so endpoints that are not components (e.g. a group
+    without members) are plain text nodes.
+    The strategy's merge_edges is ignored, as merging would mean holding every
+    connection.
+    """
+
+    def __init__(
+        self,
+        image_directory="images",
+        layout="sfdp",
+        fontname="Arial",
+        fontsize="10",
+        fontcolor="black",
+    ):
+        self.image_directory = image_directory
+        self.image_index = get_image_index(image_directory)
+        self.strategy = get_strategy(layout)
+        self.fontname = fontname
+        self.fontsize = fontsize
+        self.fontcolor = fontcolor
+
+    def find_image(self, component):
+        # A filename in image_directory, which is the graph's imagepath
+        return self.image_index.match(component)
+
+    def write(self, out, components, connections, groups=()):
+        """Write the DOT source to a text file object or pipe."""
+        for chunk in self.iter_dot(components, connections, groups):
+            out.write(chunk)
+
+    def iter_dot(self, components, connections, groups=()):
+        """Yield the DOT source in chunks of about CHUNK_LINES lines."""
+        lines = []
+        seconds = 0.0
+        start = time.perf_counter()
+        for line in self._lines(components, connections, groups):
+            lines.append(line)
+            if len(lines) >= CHUNK_LINES:
+                seconds += time.perf_counter() - start
+                yield "".join(lines)
+                lines = []
+                start = time.perf_counter()
+        seconds += time.perf_counter() - start
+        yield "".join(lines)
+        metrics.record(
+            "build_dot", seconds, nodes=self.nodes, edges=self.edges, streamed=True
+        )
+
+    def _lines(self, components, connections, groups):
+        strategy = self.strategy
+        font = {
+            "fontname": self.fontname,
+            "fontsize": self.fontsize,
+            "fontcolor": self.fontcolor,
+        }
+        group_names = {group["name"] for group in groups}
+        group_nodes = {}  # group name -> node ID, once the group has been opened
+        self.nodes = self.edges = 0
+
+        yield "// Tech Diagram\ndigraph {\n"
+        graph = _attrs(imagepath=self.image_directory, **font, **strategy.attributes())
+        yield f"\tgraph [{graph}]\n"
+        yield (
+            f"\tnode [{_attrs(shape='none', **font)} imagescale=true "
+            'imagepos="tc" labelloc="b" fixedsize=true]\n'
+        )
+        yield f"\tedge [{_attrs(**font, penwidth='1.0')}]\n"
+
+        block = None  # group whose cluster is open
+        image = None  # image= default in effect in the current block
+        root_image = None  # image= default in effect outside clusters
+        indent = "\t"
+        for component in components:
+            group = component.get("group") or None
+            if strategy.clusters and group != block:
+                if block is not None:
+                    yield "\t}\n"
+                block, image = group, None
+                indent = "\t\t" if group else "\t"
+                if group:
+                    yield f"\tsubgraph {quote('cluster_' + group)} {{\n"
+                    if group not in group_nodes:
+                        yield (
+                            f"\t\tgraph [{_attrs(label=group, **font)} "
+                            'style="rounded" color="gray" penwidth="1"]\n'
+                        )
+                        group_nodes[group] = f"group_invisible_{group}"
+                        yield (
+                            f'\t\t{quote(group_nodes[group])} [label="" '
+                            'shape="point" width="0" height="0" style="invis"]\n'
+                        )
+            elif not strategy.clusters and group and group not in group_nodes:
+                # As in DiagramVisualiser: a labelled node members are tied to
+                group_nodes[group] = f"group_invisible_{group}"
+                yield (
+                    f"\t{quote(group_nodes[group])} [{_attrs(label=group)} "
+                    'shape="box" style="rounded" color="gray" image="" '
+                    "fixedsize=false]\n"
+                )
+
+            image_name = self.find_image(component) or ""
+            if image_name != image:
+                height = ICON_HEIGHT if image_name else TEXT_HEIGHT
+                yield (
+                    f"{indent}node [{_attrs(image=image_name)} "
+                    f"width={ICON_WIDTH} height={height}]\n"
+                )
+                image = image_name
+                if indent == "\t":
+                    root_image = image_name
+            name = quote(component["name"])
+            yield f"{indent}{name}\n"
+            if not strategy.clusters and group:
+                yield f'\t{quote(group_nodes[group])} -> {name} [style="invis"]\n'
+            self.nodes += 1
+        if block is not None:
+            yield "\t}\n"
+        if root_image != "":
+            # Nodes created by an edge would take the last icon otherwise
+            yield f'\tnode [image="" width={ICON_WIDTH} height={TEXT_HEIGHT}]\n'
+
+        for conn in connections:
+            from_node = conn["from"]
+            to_node = conn["to"]
+            if from_node in group_names:
+                from_node = group_nodes.get(from_node, from_node)
+            if to_node in group_names:
+                to_node = group_nodes.get(to_node, to_node)
+            label = conn.get("label")
+            attrs = f" [{_attrs(label=label)}]" if label else ""
+            yield f"\t{quote(from_node)} -> {quote(to_node)}{attrs}\n"
+            self.edges += 1
+        yield "}\n"
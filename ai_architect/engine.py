@@ -0,0 +1,259 @@
+import subprocess
+import threading
+
+
+class RenderError(RuntimeError):
+    """A graphviz layout engine failed or could not be run."""
+
+
+class RenderTimeout(RenderError):
+    """A graphviz layout engine ran past its time budget and was killed."""
+
+
+def run_dot(source, format="png", engine="dot", output=None, timeout=None, args=()):
+    """
+    Lay out and render DOT source with a graphviz engine in a subprocess.
+
+    The source is piped over stdin. It may also be an iterable of str chunks
+    (e.g. DotWriter.iter_dot()), which are written as they are produced so the
+    whole source is never held in memory. With output set the result is
+    written to that path and None is returned; otherwise the rendered bytes
+    are returned.
+
+    format may also be a list of formats, with output a list of paths, one
+    per format. The graph is then laid out once and each format is written
+    from that one layout. args are extra command line options, e.g. ["-n2"].
+    """
+    if isinstance(format, str):
+        cmd = [engine, *args, f"-T{format}"]
+        if output is not None:
+            cmd += ["-o", output]
+    else:
+        cmd = [engine, *args]
+        for each, path in zip(format, output):
+            cmd += [f"-T{each}", "-o", path]
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if not isinstance(source, bytes):
+        return _run_streaming(cmd, source, output, timeout)
+    try:
+        proc = subprocess.run(
+            cmd,
+            input=source,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired as e:
+        raise RenderTimeout(f"{engine} timed out after {timeout}s") from e
+    except OSError as e:
+        raise RenderError(f"Could not run {engine}: {e}") from e
+    if proc.returncode != 0:
+        stderr = proc.stderr.decode("utf-8", "replace").strip()
+        raise RenderError(f"{engine} exited with {proc.returncode}: {stderr}")
+    return None if output is not None else proc.stdout
+
+
+def _run_streaming(cmd, chunks, output, timeout):
+    engine = cmd[0]
+    try:
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except OSError as e:
+        raise RenderError(f"Could not run {engine}: {e}") from e
+
+    # Drain stdout and stderr in threads so a full pipe cannot stall the writer
+    outputs = {}
+
+    def drain(name, stream):
+        outputs[name] = stream.read()
+
+    readers = [
+        threading.Thread(target=drain, args=(name, stream), daemon=True)
+        for name, stream in (("stdout", proc.stdout), ("stderr", proc.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, expire) if timeout else None
+    if timer is not None:
+        timer.start()
+    try:
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk.encode("utf-8"))
+            proc.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass  # the engine exited early; its return code explains why
+        except BaseException:
+            proc.kill()
+            raise
+        proc.wait()
+        for reader in readers:
+            reader.join()
+    finally:
+        if timer is not None:
+            timer.cancel()
+    if expired.is_set():
+        raise RenderTimeout(f"{engine} timed out after {timeout}s")
+    if proc.returncode != 0:
+        stderr = outputs.get("stderr", b"").decode("utf-8", "replace").strip()
+        raise RenderError(f"{engine} exited with {proc.returncode}: {stderr}")
+    return None if output is not None else outputs.get("stdout", b"")
+
+
+class _DotProcess:
+    """One long-lived engine process rendering graphs from stdin, one at a time."""
+
+    def __init__(self, engine, format):
+        self.format = format
+        self.proc = subprocess.Popen(
+            [engine, f"-T{format}"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self._buffer = b""
+        self.expired = False
+
+    def render(self, source, timeout=None):
+        timer = threading.Timer(timeout, self._expire) if timeout else None
+        if timer is not None:
+            timer.start()
+        try:
+            self.proc.stdin.write(source + b"\n")
+            if self.format == "png":
+                return self._read_png()
+            return self._read_svg()
+        except (OSError, ValueError, RenderError) as e:
+            if self.expired:
+                raise RenderTimeout(f"Render timed out after {timeout}s") from e
+            raise RenderError(f"Warm {self.format} worker failed: {e}") from e
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def _expire(self):
+        self.expired = True
+        self.proc.kill()
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+    def _fill(self, size):
+        while len(self._buffer) < size:
+            chunk = self.proc.stdout.read(65536)
+            if not chunk:
+                raise RenderError("Warm worker exited before finishing its output")
+            self._buffer += chunk
+
+    def _take(self, size):
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_png(self):
+        # A PNG is its signature followed by chunks up to and including IEND
+        self._fill(8)
+        pos = 8
+        while True:
+            self._fill(pos + 8)
+            length = int.from_bytes(self._buffer[pos : pos + 4], "big")
+            chunk_type = self._buffer[pos + 4 : pos + 8]
+            pos += 12 + length
+            if chunk_type == b"IEND":
+                self._fill(pos)
+                return self._take(pos)
+
+    def _read_svg(self):
+        while True:
+            self._buffer = self._buffer.lstrip()
+            end = self._buffer.find(b"</svg>")
+            if end != -1:
+                return self._take(end + len(b"</svg>")) + b"\n"
+            chunk = self.proc.stdout.read(65536)
+            if not chunk:
+                raise RenderError("Warm worker exited before finishing its output")
+            self._buffer += chunk
+
+
+class DotPool:
+    """
+    A small pool of warm layout engine processes.
+
+    Graphviz reads any number of graphs from stdin and writes one image per
+    graph, so a kept-alive `dot -Tpng` / `dot -Tsvg` process skips the start-up
+    and plugin loading cost on every render after the first. Output is framed
+    by the format itself (PNG IEND chunk, SVG closing tag). Other formats, and
+    any render a warm process fails on, fall back to a one-shot run_dot().
+    """
+
+    STREAMABLE_FORMATS = ("png", "svg")
+
+    def __init__(self, size=2, engine="dot", timeout=60):
+        self.size = size
+        self.engine = engine
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def render(self, source, format="png", timeout=None):
+        """Render source; timeout overrides the pool's per-render timeout."""
+        timeout = self.timeout if timeout is None else timeout
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        if format not in self.STREAMABLE_FORMATS:
+            return run_dot(source, format, self.engine, timeout=timeout)
+
+        with self._slots:
+            try:
+                worker = self._checkout(format)
+            except OSError as e:
+                raise RenderError(f"Could not run {self.engine}: {e}") from e
+            try:
+                data = worker.render(source, timeout)
+            except RenderTimeout:
+                worker.close()
+                raise
+            except RenderError:
+                worker.close()
+                return run_dot(source, format, self.engine, timeout=timeout)
+            self._checkin(worker)
+            return data
+
+    def close(self):
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle = {}
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _checkout(self, format):
+        with self._lock:
+            idle = self._idle.get(format)
+            if idle:
+                return idle.pop()
+        return _DotProcess(self.engine, format)
+
+    def _checkin(self, worker):
+        with self._lock:
+            idle = self._idle.setdefault(worker.format, [])
+            if len(idle) < self.size and worker.proc.poll() is None:
+                idle.append(worker)
+                return
+        worker.close()
@@ -2,158 +2,289 @@
 
 import json
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+import time
 
-load_dotenv()
+from .image_index import get_image_index
+from .metrics import metrics
+from .parser import DiagramError, fix_instruction, parse_diagram, validate_diagram
+from .prompt import SYSTEM_PROMPT, PromptBuilder
+from .refine import DiagramSession, PatchError
+from .streaming import DiagramStream
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_client = None
+_client_lock = threading.Lock()
+_env_loaded = False
+
+
+def load_env():
+    """Load .env into os.environ, once, before the first model call."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def default_client():
+    """
+    The shared OpenAI client, created on first use.
+
+    The openai SDK and .env are only loaded here, so importing the package,
+    or rendering existing diagrams, never pays for them or needs a key.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+
+            load_env()
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _client
+
+
+def _record_usage(event, usage):
+    if usage is not None:
+        event["prompt_tokens"] = usage.prompt_tokens
+        event["completion_tokens"] = usage.completion_tokens
+
+
+class ModelLadder:
+    """
+    Models to try for a description, fastest first.
+
+    tiers is a sequence of (model, max_words) pairs. A tier is skipped for
+    descriptions of more than max_words words (None: no limit), so large
+    descriptions go straight to a capable model; the last tier takes every
+    description. See DiagramGenerator.generate_valid_diagram for how tiers
+    escalate.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = [(model, max_words) for model, max_words in tiers]
+        if not self.tiers:
+            raise ValueError("A model ladder needs at least one tier")
+
+    @classmethod
+    def parse(cls, value):
+        """Parse "model[:max_words],...", fastest first: "gpt-4o-mini:400,gpt-4"."""
+        tiers = []
+        for item in value.split(","):
+            model, _, max_words = item.strip().partition(":")
+            tiers.append((model, int(max_words) if max_words else None))
+        return cls(tiers)
+
+    @classmethod
+    def from_env(cls):
+        """Build a ladder from AI_ARCHITECT_MODELS (see parse), or None."""
+        value = os.getenv("AI_ARCHITECT_MODELS")
+        return cls.parse(value) if value else None
+
+    def models_for(self, description):
+        """The models to try for description, in order."""
+        words = len(description.split())
+        models = [
+            model
+            for model, max_words in self.tiers[:-1]
+            if max_words is None or words <= max_words
+        ]
+        return models + [self.top]
+
+    @property
+    def top(self):
+        return self.tiers[-1][0]
+
+    def __repr__(self):
+        return f"ModelLadder({self.tiers!r})"
 
 
 class DiagramGenerator:
+    def __init__(
+        self,
+        model="gpt-4",
+        cache=None,
+        image_directory="images",
+        client=None,
+        catalog_mode=None,
+        top_k=40,
+        ladder=None,
+    ):
+        # With a ladder, its top tier is the model for fixes and refinement
+        self.model = ladder.top if ladder is not None else model
+        self.ladder = ladder
+        self._client = client
+        self.cache = cache
+        self.image_directory = image_directory
+        self.prompt_builder = PromptBuilder(image_directory, catalog_mode, top_k)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = default_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def build_prompt(self, description, model=None):
+        return self.prompt_builder.build(description, model or self.model)
+
+    def build_messages(self, description, model=None, prompt=None):
+        # prompt: one already built for description, e.g. by
+        # prompt_builder.render()
+        if prompt is None:
+            prompt = self.build_prompt(description, model)
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+
+    def cache_key(self, model, messages):
+        if self.cache is None:
+            return None
+        catalog = get_image_index(self.image_directory).filenames
+        return self.cache.key(model, messages, catalog)
+
+    def complete(self, messages, model=None):
+        model = model or self.model
+        with metrics.stage("generate", model=model, cache_hit=False) as event:
+            key = self.cache_key(model, messages)
+            if key is not None:
+                content = self.cache.get(key)
+                if content is not None:
+                    event["cache_hit"] = True
+                    return content
+
+            response = self.client.chat.completions.create(
+                model=model, messages=messages
+            )
+            content = response.choices[0].message.content
+            _record_usage(event, getattr(response, "usage", None))
+
+            if key is not None:
+                self.cache.put(key, model, content)
+            return content
+
     def generate_diagram(self, description):
-        prompt = f"""
-        Generate a JSON representation of a system architecture based on the following description:
-
-        {description}
-
-        The JSON should strictly adhere to the following structure and guidelines:
-
-        1. Groups: Categorize components into logical groups (e.g., cloud providers, data sources, user types).
-        2. Components: List all system components with their details.
-        3. Connections: Describe how components are connected or interact.
-
-        Use the following schema:
-
-        {{
-            "groups": [
-                {{
-                    "name": "group_name",
-                    "type": "group_type" // e.g., "cloud_provider", "data_source", "user_group", etc.
-                }}
-            ],
-            "components": [
-                {{
-                    "name": "component_name",
-                    "type": "component_type",
-                    "group": "group_name",
-                    "image": "image_filename.png"
-                }}
-            ],
-            "connections": [
-                {{
-                    "from": "component_name1",
-                    "to": "component_name2",
-                    "label": "connection_description"
-                }}
-            ]
-        }}
-
-        List of available images:
-            {os.listdir('images')}
-
-        Image Naming Guidelines:
-        1. For specific cloud services, use "[provider]-[service].png" (e.g., "aws-lambda.png", "azure-sql-database.png").
-        2. For generic services, use descriptive names (e.g., "database.png", "api.png", "server.png").
-        3. For user roles always use "user.png".
-        4. If unsure, use a generic term related to the component type.
-
-        Example:
-        Given the description: "A web application using AWS. It has a React frontend hosted on S3, an API Gateway connecting to Lambda functions, and a DynamoDB database. CloudFront is used as a CDN."
-
-        The JSON output should be:
-
-        {{
-            "groups": [
-                {{
-                    "name": "AWS",
-                    "type": "cloud_provider"
-                }},
-                {{
-                    "name": "Frontend",
-                    "type": "client_side"
-                }}
-            ],
-            "components": [
-                {{
-                    "name": "React App",
-                    "type": "frontend_framework",
-                    "group": "Frontend",
-                    "image": "react.png"
-                }},
-                {{
-                    "name": "S3 Bucket",
-                    "type": "object_storage",
-                    "group": "AWS",
-                    "image": "aws-s3.png"
-                }},
-                {{
-                    "name": "CloudFront",
-                    "type": "cdn",
-                    "group": "AWS",
-                    "image": "aws-cloudfront.png"
-                }},
-                {{
-                    "name": "API Gateway",
-                    "type": "api_management",
-                    "group": "AWS",
-                    "image": "aws-api-gateway.png"
-                }},
-                {{
-                    "name": "Lambda",
-                    "type": "serverless_function",
-                    "group": "AWS",
-                    "image": "aws-lambda.png"
-                }},
-                {{
-                    "name": "DynamoDB",
-                    "type": "nosql_database",
-                    "group": "AWS",
-                    "image": "aws-dynamodb.png"
-                }}
-            ],
-            "connections": [
-                {{
-                    "from": "React App",
-                    "to": "CloudFront",
-                    "label": "user access"
-                }},
-                {{
-                    "from": "CloudFront",
-                    "to": "S3 Bucket",
-                    "label": "origin"
-                }},
-                {{
-                    "from": "React App",
-                    "to": "API Gateway",
-                    "label": "API calls"
-                }},
-                {{
-                    "from": "API Gateway",
-                    "to": "Lambda",
-                    "label": "triggers"
-                }},
-                {{
-                    "from": "Lambda",
-                    "to": "DynamoDB",
-                    "label": "read/write"
-                }}
-            ]
-        }}
-
-        Ensure your output is a valid JSON object containing only the requested structure.
-        Do not include any explanatory text or markdown formatting.
+        return self.complete(self.build_messages(description))
+
+    def generate_valid_diagram(self, description, retries=1):
+        """
+        Generate, parse and validate a diagram; see parse_response.
+
+        With a ladder, each of its models for description is tried in turn,
+        fastest first. A response that fails validation escalates to the next
+        model; only the last one gets `retries` fix requests. Each attempt is
+        recorded as a "tier:<model>" stage whose "escalated" total, over its
+        count, is that tier's escalation rate.
+        """
+        if self.ladder is None:
+            return self.parse_response(self.generate_diagram(description), retries)
+        models = self.ladder.models_for(description)
+        for index, model in enumerate(models):
+            last = index == len(models) - 1
+            with metrics.stage(f"tier:{model}", escalated=False) as event:
+                text = self.complete(self.build_messages(description, model), model)
+                try:
+                    return self.parse_response(text, retries if last else 0)
+                except DiagramError as e:
+                    if last:
+                        raise
+                    event["escalated"] = True
+                    event["issues"] = len(e.issues)
+
+    def parse_response(self, text, retries=1):
         """
+        Parse a model response into a valid diagram.
 
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a technical diagram generator that outputs only valid JSON.",
-                },
-                {"role": "user", "content": prompt},
-            ],
+        Problems the parser can locate are fixed with up to `retries` patch
+        requests against what was recovered, instead of a full re-generation.
+        Raises DiagramError if the diagram is still invalid.
+        """
+        try:
+            with metrics.stage("parse", characters=len(text)) as event:
+                try:
+                    return parse_diagram(text)
+                except DiagramError as e:
+                    # Set before the stage records the event
+                    event["issues"] = len(e.issues)
+                    raise
+        except DiagramError as e:
+            if e.diagram is None or not retries:
+                raise
+            return self.fix_diagram(e.diagram, e.issues, retries)
+
+    def fix_diagram(self, diagram, issues, retries=1):
+        """
+        Ask for JSON Patches fixing issues, re-validating after each one.
+
+        Returns the fixed diagram, or raises DiagramError with the issues
+        that remain after `retries` attempts.
+        """
+        session = self.refine_session(diagram)
+        with metrics.stage("fix", issues=len(issues)) as event:
+            for attempt in range(1, retries + 1):
+                event["attempts"] = attempt
+                try:
+                    diagram = session.refine(fix_instruction(issues))
+                except PatchError:
+                    continue
+                issues = validate_diagram(diagram)
+                if not issues:
+                    return diagram
+            event["remaining"] = len(issues)
+        raise DiagramError(issues, diagram)
+
+    def refine_session(self, diagram):
+        """Start a DiagramSession that refines diagram through small patches."""
+        return DiagramSession(self, diagram)
+
+    def generate_diagram_stream(self, description, on_event=None, prompt=None):
+        """
+        Stream a diagram, yielding (kind, object) events as each object closes.
+
+        on_event(kind, obj) is also called for every event. The returned
+        DiagramStream exposes the raw `text` and the assembled `diagram`.
+        prompt is used instead of building one for description.
+        """
+        start = time.perf_counter()
+        messages = self.build_messages(description, prompt=prompt)
+        model = self.model
+        key = self.cache_key(model, messages)
+        if key is not None:
+            content = self.cache.get(key)
+            if content is not None:
+                metrics.record(
+                    "generate",
+                    time.perf_counter() - start,
+                    model=model,
+                    cache_hit=True,
+                    stream=True,
+                )
+                return DiagramStream([content], on_event)
+
+        event = {"model": model, "cache_hit": False, "stream": True}
+
+        def on_complete(text):
+            if key is not None:
+                self.cache.put(key, model, text)
+            metrics.record("generate", time.perf_counter() - start, **event)
+
+        return DiagramStream(
+            self._stream_chunks(messages, model, event), on_event, on_complete
         )
 
-        return response.choices[0].message.content
+    def _stream_chunks(self, messages, model, event):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            # With include_usage the final chunk carries usage and no choices
+            _record_usage(event, getattr(chunk, "usage", None))
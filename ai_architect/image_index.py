@@ -0,0 +1,225 @@
+import json
+import math
+import os
+import re
+import threading
+from difflib import SequenceMatcher
+
+# Extensions tried, in order, when a component word is looked up as a filename
+IMAGE_EXTENSIONS = (".png", ".jpg", ".svg")
+
+# Same defaults as difflib.get_close_matches
+CLOSE_MATCH_CUTOFF = 0.6
+NGRAM_SIZE = 3
+
+# Written by tools/image_resizer.py into the directories it fills
+RESIZE_MANIFEST = ".resize-manifest.json"
+
+
+def component_words(component):
+    """Split a component's image, name and type into lowercase match words, in order."""
+    words = {}
+    for value in (
+        component.get("image", ""),
+        component.get("name", ""),
+        component.get("type", ""),
+    ):
+        if not value:
+            continue
+        for word in value.lower().replace("-", " ").replace("_", " ").split():
+            words.setdefault(word, None)
+    return list(words)
+
+
+def text_words(text):
+    """Lowercase alphanumeric words of text, with a plural "s" dropped."""
+    words = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def icon_size(directory):
+    """
+    The (width, height) every icon in directory was normalised to, or None.
+
+    Read from the manifest tools/image_resizer.py leaves in an icon pack.
+    """
+    try:
+        with open(os.path.join(directory, RESIZE_MANIFEST), encoding="utf-8") as f:
+            sizes = {tuple(entry["size"]) for entry in json.load(f).values()}
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    return sizes.pop() if len(sizes) == 1 else None
+
+
+def _ngrams(text, n=NGRAM_SIZE):
+    padded = f"{'$' * (n - 1)}{text}{'$' * (n - 1)}"
+    return {padded[i : i + n] for i in range(len(padded) - n + 1)}
+
+
+class ImageIndex:
+    """
+    Lookup structures over the files of an image directory.
+
+    Built once per directory and shared between visualisers via get_image_index.
+    Lookups follow the same fallbacks as scanning os.listdir() per component:
+    exact filename, then "<word>.<ext>" via the token index, then the closest
+    basename ranked as difflib.get_close_matches ranks it. Fuzzy candidates come
+    from a character n-gram index; the remaining basenames are only compared
+    when their length and characters could still beat the best candidate, and
+    results are memoised per word.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.mtime = os.stat(directory).st_mtime_ns
+        # Hidden files (manifests, temporary files) are not icons
+        self.filenames = [f for f in os.listdir(directory) if not f.startswith(".")]
+        self._filename_set = set(self.filenames)
+        self.icon_size = icon_size(directory)
+
+        # Token index: exact (case-sensitive) stem -> {extension: filename}
+        self._stems = {}
+        # Lowercase basename -> first filename with that basename (listdir order)
+        self._basenames = {}
+        # Character n-gram -> lowercase basenames containing it
+        self._ngrams = {}
+        # Basename length -> lowercase basenames of that length
+        self._lengths = {}
+        # Word of an image stem -> image filenames containing it, for search()
+        self._words = {}
+        self._word_counts = {}
+
+        for filename in self.filenames:
+            stem, ext = os.path.splitext(filename)
+            self._stems.setdefault(stem, {}).setdefault(ext, filename)
+
+            if ext.lower() in IMAGE_EXTENSIONS:
+                words = set(text_words(stem))
+                self._word_counts[filename] = len(words)
+                for word in words:
+                    self._words.setdefault(word, []).append(filename)
+
+            basename = stem.lower()
+            if basename in self._basenames:
+                continue
+            self._basenames[basename] = filename
+            self._lengths.setdefault(len(basename), []).append(basename)
+            for gram in _ngrams(basename):
+                self._ngrams.setdefault(gram, []).append(basename)
+
+        self._close_matches = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, filename):
+        return filename in self._filename_set
+
+    def match(self, component):
+        """Return the filename best matching a component, or None."""
+        image_name = component.get("image", "")
+        if image_name and image_name in self._filename_set:
+            return image_name
+
+        words = component_words(component)
+        for word in words:
+            by_ext = self._stems.get(word)
+            if by_ext:
+                for ext in IMAGE_EXTENSIONS:
+                    if ext in by_ext:
+                        return by_ext[ext]
+        for word in words:
+            filename = self.closest(word)
+            if filename:
+                return filename
+        return None
+
+    def closest(self, word):
+        """Return the filename whose basename is closest to word, or None."""
+        with self._lock:
+            if word in self._close_matches:
+                return self._close_matches[word]
+
+        candidates = set()
+        for gram in _ngrams(word):
+            candidates.update(self._ngrams.get(gram, ()))
+        best = self._best_match(word, candidates)
+        # Strings can be similar without sharing an n-gram, so also try every
+        # other basename whose length still allows beating the best so far
+        cutoff = best[0] if best else CLOSE_MATCH_CUTOFF
+        others = (
+            basename
+            for basename in self._length_window(len(word), cutoff)
+            if basename not in candidates
+        )
+        best = self._best_match(word, others, best)
+        basename = best[1] if best else None
+
+        filename = self._basenames[basename] if basename is not None else None
+        with self._lock:
+            self._close_matches[word] = filename
+        return filename
+
+    def search(self, text, k):
+        """
+        Return up to k image filenames ranked by relevance to free text.
+
+        Each word shared between the text and an image name scores its inverse
+        document frequency; the sum is normalised by the square root of the
+        number of words in the name, so "aws-lambda.png" beats "aws.png" for a
+        description mentioning both AWS and Lambda.
+        """
+        total = len(self._word_counts)
+        scores = {}
+        for word in set(text_words(text)):
+            filenames = self._words.get(word)
+            if not filenames:
+                continue
+            idf = math.log(1 + total / len(filenames))
+            for filename in filenames:
+                scores[filename] = scores.get(filename, 0.0) + idf
+        ranked = sorted(
+            scores,
+            key=lambda f: (-scores[f] / math.sqrt(self._word_counts[f]), f),
+        )
+        return ranked[:k]
+
+    def _length_window(self, length, cutoff=CLOSE_MATCH_CUTOFF):
+        # Same bound as SequenceMatcher.real_quick_ratio(): other lengths never
+        # reach cutoff
+        for size, basenames in self._lengths.items():
+            if 2.0 * min(size, length) / (size + length) >= cutoff:
+                yield from basenames
+
+    def _best_match(self, word, candidates, best=None):
+        # Mirrors difflib.get_close_matches(word, basenames)[0]: highest ratio,
+        # ties broken by the larger string. Returns (ratio, basename) or None;
+        # best is a result to improve on.
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        for basename in candidates:
+            matcher.set_seq1(basename)
+            cutoff = best[0] if best else CLOSE_MATCH_CUTOFF
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff and (best is None or (ratio, basename) > best):
+                    best = (ratio, basename)
+        return best
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_image_index(directory):
+    """Return the shared ImageIndex for directory, rebuilt if the directory changed."""
+    key = os.path.abspath(directory)
+    mtime = os.stat(directory).st_mtime_ns
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or index.mtime != mtime:
+            index = ImageIndex(directory)
+            _indexes[key] = index
+        return index
@@ -0,0 +1,135 @@
+class LayoutStrategy:
+    """
+    How to lay out a diagram: the graphviz engine, edge routing and whether
+    groups become clusters.
+
+    budget is the number of seconds a render with this strategy may take
+    before the visualiser gives up on it and falls back to the next strategy
+    in fallbacks.
+    """
+
+    def __init__(
+        self,
+        name,
+        engine="dot",
+        splines="ortho",
+        clusters=True,
+        merge_edges=False,
+        budget=None,
+        fallbacks=(),
+        **graph_attrs,
+    ):
+        self.name = name
+        self.engine = engine
+        self.splines = splines
+        self.clusters = clusters
+        self.merge_edges = merge_edges
+        self.budget = budget
+        self.fallbacks = tuple(fallbacks)
+        self.graph_attrs = graph_attrs
+
+    def attributes(self):
+        """Graph attributes selecting this strategy in the DOT source itself."""
+        attrs = {"layout": self.engine, "splines": self.splines}
+        attrs.update(self.graph_attrs)
+        return attrs
+
+    def __repr__(self):
+        return f"LayoutStrategy({self.name!r}, engine={self.engine!r})"
+
+
+STRATEGIES = {
+    # The original look: ranked left to right, right-angled edges, one box per group
+    "ortho": LayoutStrategy(
+        "ortho",
+        budget=20,
+        fallbacks=("polyline", "sfdp"),
+        rankdir="LR",
+        nodesep="0.3",
+        ranksep="0.5",
+    ),
+    "polyline": LayoutStrategy(
+        "polyline",
+        splines="polyline",
+        merge_edges=True,
+        budget=30,
+        fallbacks=("sfdp",),
+        rankdir="LR",
+        nodesep="0.3",
+        ranksep="0.5",
+    ),
+    "spline": LayoutStrategy(
+        "spline",
+        splines="true",
+        merge_edges=True,
+        budget=30,
+        fallbacks=("sfdp",),
+        rankdir="LR",
+        nodesep="0.3",
+        ranksep="0.5",
+    ),
+    # Force-directed layouts for dense graphs, which dot ranks badly
+    "fdp": LayoutStrategy(
+        "fdp",
+        engine="fdp",
+        splines="true",
+        merge_edges=True,
+        budget=30,
+        fallbacks=("sfdp",),
+        overlap="prism",
+        sep="+10",
+    ),
+    # Multiscale force-directed, scales to thousands of nodes but drops clusters
+    "sfdp": LayoutStrategy(
+        "sfdp",
+        engine="sfdp",
+        splines="false",
+        clusters=False,
+        merge_edges=True,
+        overlap="prism",
+        sep="+10",
+    ),
+}
+
+# Above these sizes orthogonal routing, then dot itself, become too slow
+ORTHO_MAX_NODES = 60
+ORTHO_MAX_EDGES = 120
+DOT_MAX_NODES = 300
+DOT_MAX_EDGES = 800
+DENSE_EDGES_PER_NODE = 3.0
+
+
+def choose_strategy(nodes, edges):
+    """Pick a layout strategy name for a graph of the given size."""
+    if nodes <= ORTHO_MAX_NODES and edges <= ORTHO_MAX_EDGES:
+        return "ortho"
+    if nodes <= DOT_MAX_NODES and edges <= DOT_MAX_EDGES:
+        if edges / nodes > DENSE_EDGES_PER_NODE:
+            return "fdp"
+        return "polyline"
+    return "sfdp"
+
+
+def get_strategy(layout, nodes=0, edges=0):
+    """
+    Resolve layout to a LayoutStrategy.
+
+    layout may be a LayoutStrategy, the name of one in STRATEGIES, or "auto"
+    (or None) to choose by graph size.
+    """
+    if isinstance(layout, LayoutStrategy):
+        return layout
+    if layout in (None, "auto"):
+        layout = choose_strategy(nodes, edges)
+    try:
+        return STRATEGIES[layout]
+    except KeyError:
+        raise ValueError(
+            f"Unknown layout {layout!r}; expected 'auto' or one of "
+            f"{', '.join(STRATEGIES)}"
+        ) from None
+
+
+def fallback_chain(strategy):
+    """The strategy followed by the strategies to try if it runs out of time."""
+    return [strategy] + [STRATEGIES[name] for name in strategy.fallbacks]
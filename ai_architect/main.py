@@ -1,7 +1,12 @@
-from .generator import DiagramGenerator
+from .cache import ResponseCache
+from .generator import DiagramGenerator, ModelLadder, load_env
+from .image_index import get_image_index
+from .metrics import configure_from_env, metrics
+from .parser import DiagramError
 from .visualiser import DiagramVisualiser
 
 import json
+import os
 
 
 def print_diagram_syntax(syntax):
@@ -32,7 +37,11 @@ def print_diagram_syntax(syntax):
 
 
 def main():
-    generator = DiagramGenerator()
+    load_env()
+    configure_from_env()
+    generator = DiagramGenerator(
+        cache=ResponseCache.from_env(), ladder=ModelLadder.from_env()
+    )
 
     description = """
    This is an AWS-based data analytics pipeline for a retail company. The system integrates data from multiple sources, processes it, and stores it in a data warehouse for analysis. Here are the key components and their interactions:
@@ -77,33 +86,35 @@ This pipeline ensures that the latest data from all sources is available in the
 
     print("Starting diagram generation...")
     try:
-        diagram_data = generator.generate_diagram(description)
+        # Stream the response so image matching overlaps with generation
+        image_index = get_image_index("images")
+        prompt, report = generator.prompt_builder.render(description, generator.model)
+        stream = generator.generate_diagram_stream(description, prompt=prompt)
+        for kind, item in stream:
+            if kind == "component":
+                image_index.match(item)
+            label = item.get("name") or f"{item.get('from')} -> {item.get('to')}"
+            print(f"  {kind}: {label}")
+        diagram_data = stream.text
         print("Diagram generation completed.")
+        print("Prompt:", report)
         print("Raw diagram data:")
         print(diagram_data)
         print("Type of diagram_data:", type(diagram_data))
 
-        print("\nAttempting to parse as JSON...")
+        print("\nParsing and validating...")
         try:
-            parsed_data = json.loads(diagram_data)
-            print("Successfully parsed JSON:")
-            print(json.dumps(parsed_data, indent=2))
-        except json.JSONDecodeError as json_error:
-            print(f"Failed to parse JSON: {json_error}")
-            print("Attempting to extract JSON from the response...")
-            # Try to find and extract a JSON object from the string
-            import re
-
-            json_match = re.search(r"\{.*\}", diagram_data, re.DOTALL)
-            if json_match:
-                try:
-                    parsed_data = json.loads(json_match.group())
-                    print("Successfully extracted and parsed JSON:")
-                    print(json.dumps(parsed_data, indent=2))
-                except json.JSONDecodeError:
-                    print("Failed to parse extracted JSON")
-            else:
-                print("No JSON object found in the response")
+            parsed_data = generator.parse_response(diagram_data, retries=0)
+        except DiagramError as e:
+            print("Problems found in the diagram:")
+            for issue in e.issues:
+                print(f"  {issue}")
+            if e.diagram is None:
+                raise
+            print("Requesting a targeted fix...")
+            parsed_data = generator.fix_diagram(e.diagram, e.issues)
+        print("Successfully parsed diagram:")
+        print(json.dumps(parsed_data, indent=2))
 
         print("\nVisualizing...")
         visualizer = DiagramVisualiser(parsed_data)
@@ -117,6 +128,10 @@ This pipeline ensures that the latest data from all sources is available in the
 
         print("Full traceback:")
         print(traceback.format_exc())
+    finally:
+        prometheus_path = os.getenv("AI_ARCHITECT_METRICS_PROM")
+        if prometheus_path:
+            metrics.write_prometheus(prometheus_path)
 
 
 if __name__ == "__main__":
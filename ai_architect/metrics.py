@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Collects timing events for pipeline stages.
+
+    Each event is a dict with at least "stage", "seconds" and "time", plus any
+    stage-specific fields (token counts, node and edge counts, cache hits).
+    Events are passed to every registered hook and folded into running totals
+    that write_prometheus() exports.
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> [count, seconds]
+        self._totals = {}  # (stage, field) -> sum of numeric field values
+
+    def add_hook(self, hook):
+        """Register hook(event) to be called for every recorded event."""
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Time the enclosed block as one event for stage `name`.
+
+        Yields the event's field dict so the block can add counts it only
+        learns while running. An exception is recorded as the "error" field.
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, **fields)
+
+    def record(self, name, seconds, **fields):
+        event = {"stage": name, "seconds": seconds, "time": time.time(), **fields}
+        with self._lock:
+            totals = self._stages.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            for field, value in fields.items():
+                if isinstance(value, (bool, int, float)):
+                    key = (name, field)
+                    self._totals[key] = self._totals.get(key, 0) + value
+        for hook in list(self.hooks):
+            hook(event)
+        return event
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {
+                    name: {"count": count, "seconds": seconds}
+                    for name, (count, seconds) in self._stages.items()
+                },
+                "totals": {
+                    f"{name}.{field}": value
+                    for (name, field), value in self._totals.items()
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._totals = {}
+
+    def prometheus_text(self, prefix="ai_architect"):
+        """Render the running totals in the Prometheus text exposition format."""
+        with self._lock:
+            stages = sorted(self._stages.items())
+            totals = sorted(self._totals.items())
+        lines = [
+            f"# HELP {prefix}_stage_seconds Wall time spent in each pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, (count, seconds) in stages:
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {seconds}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {count}')
+
+        fields = {}
+        for (name, field), value in totals:
+            fields.setdefault(field, []).append((name, value))
+        for field, values in sorted(fields.items()):
+            metric = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', field)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for name, value in values:
+                lines.append(f'{metric}{{stage="{name}"}} {float(value)}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="ai_architect"):
+        """Atomically write prometheus_text() to path, for a textfile collector."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text(prefix))
+        os.replace(tmp_path, path)
+
+
+class JsonLinesExporter:
+    """Hook that appends every event to a file as one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+metrics = Metrics()
+
+
+def configure_from_env():
+    """Attach a JSON lines exporter if AI_ARCHITECT_METRICS_JSONL is set."""
+    path = os.getenv("AI_ARCHITECT_METRICS_JSONL")
+    if path and not any(
+        isinstance(hook, JsonLinesExporter) and hook.path == path
+        for hook in metrics.hooks
+    ):
+        metrics.add_hook(JsonLinesExporter(path))
+    return metrics
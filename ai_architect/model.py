@@ -0,0 +1,205 @@
+import json
+import sys
+
+from .parser import parse_diagram
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class _Record:
+    """
+    Base for model objects that read like their JSON object.
+
+    get() and [] take the JSON keys, so code written against the JSON schema,
+    like ImageIndex.match or DotWriter, accepts either form.
+    """
+
+    __slots__ = ()
+    _FIELDS = {}  # JSON key -> attribute
+
+    def get(self, key, default=None):
+        field = self._FIELDS.get(key)
+        if field is not None:
+            value = getattr(self, field)
+            return default if value is None else value
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def to_dict(self):
+        data = {}
+        for key, field in self._FIELDS.items():
+            value = getattr(self, field)
+            if value is not None:
+                data[key] = value
+        if self.extra:
+            data.update(self.extra)  # other JSON fields, kept for round trips
+        return data
+
+
+class Group(_Record):
+    __slots__ = ("id", "name", "type", "extra")
+    _FIELDS = {"name": "name", "type": "type"}
+
+    def __init__(self, name, type=None, extra=None, id=None):
+        self.id = id
+        self.name = _intern(name)
+        self.type = type
+        self.extra = extra or None
+
+    def __repr__(self):
+        return f"Group({self.name!r})"
+
+
+class Component(_Record):
+    __slots__ = ("id", "name", "type", "group", "image", "extra")
+    _FIELDS = {"name": "name", "type": "type", "group": "group", "image": "image"}
+
+    def __init__(self, name, type=None, group=None, image=None, extra=None, id=None):
+        self.id = id
+        self.name = _intern(name)
+        self.type = _intern(type)
+        self.group = _intern(group) or None
+        self.image = image
+        self.extra = extra or None
+
+    def __repr__(self):
+        return f"Component({self.name!r})"
+
+
+class Connection(_Record):
+    """A directed edge between two component or group names."""
+
+    __slots__ = ("id", "source", "target", "label", "extra")
+    _FIELDS = {"from": "source", "to": "target", "label": "label"}
+
+    def __init__(self, source, target, label=None, extra=None, id=None):
+        self.id = id
+        self.source = _intern(source)
+        self.target = _intern(target)
+        self.label = label
+        self.extra = extra or None
+
+    def __repr__(self):
+        return f"Connection({self.source!r} -> {self.target!r})"
+
+
+def _extra(data, known):
+    return {key: value for key, value in data.items() if key not in known} or None
+
+
+class Diagram:
+    """
+    Indexed, in-memory form of the diagram JSON schema.
+
+    Groups, components and connections get integer ids (their position) and
+    names are interned, so the many repeated group names and connection endpoints of a
+    large diagram share one string each. Lookups by name, group membership and
+    each node's incoming and outgoing connections are dicts built once in
+    O(components + connections), so every later lookup is constant time.
+    """
+
+    __slots__ = (
+        "groups",
+        "components",
+        "connections",
+        "groups_by_name",
+        "components_by_name",
+        "members",
+        "outgoing",
+        "incoming",
+    )
+
+    def __init__(self, groups=(), components=(), connections=()):
+        self.groups = list(groups)
+        self.components = list(components)
+        self.connections = list(connections)
+
+        self.groups_by_name = {}
+        for id, group in enumerate(self.groups):
+            group.id = id
+            self.groups_by_name.setdefault(group.name, group)
+
+        self.components_by_name = {}
+        # Group name (None for ungrouped) -> components, in order of appearance
+        self.members = {}
+        for id, component in enumerate(self.components):
+            component.id = id
+            self.components_by_name.setdefault(component.name, component)
+            self.members.setdefault(component.group, []).append(component)
+
+        self.outgoing = {}
+        self.incoming = {}
+        for id, connection in enumerate(self.connections):
+            connection.id = id
+            self.outgoing.setdefault(connection.source, []).append(connection)
+            self.incoming.setdefault(connection.target, []).append(connection)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load the JSON schema: {"groups": [...], "components": [...], ...}."""
+        groups = [
+            Group(g["name"], g.get("type"), _extra(g, ("name", "type")))
+            for g in data.get("groups") or ()
+        ]
+        components = [
+            Component(
+                c["name"],
+                c.get("type"),
+                c.get("group"),
+                c.get("image"),
+                _extra(c, ("name", "type", "group", "image")),
+            )
+            for c in data.get("components") or ()
+        ]
+        connections = [
+            Connection(
+                c["from"], c["to"], c.get("label"), _extra(c, ("from", "to", "label"))
+            )
+            for c in data.get("connections") or ()
+        ]
+        return cls(groups, components, connections)
+
+    @classmethod
+    def from_json(cls, text):
+        """Parse and validate a model response (see parser.parse_diagram)."""
+        return cls.from_dict(parse_diagram(text))
+
+    def to_dict(self):
+        return {
+            "groups": [group.to_dict() for group in self.groups],
+            "components": [component.to_dict() for component in self.components],
+            "connections": [connection.to_dict() for connection in self.connections],
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def is_group(self, name):
+        return name in self.groups_by_name
+
+    def group_of(self, name):
+        """The group name of component `name`, or None."""
+        component = self.components_by_name.get(name)
+        return component.group if component is not None else None
+
+    def connections_of(self, name):
+        """Connections starting or ending at component or group `name`."""
+        return self.outgoing.get(name, []) + self.incoming.get(name, [])
+
+    def __len__(self):
+        return len(self.components)
+
+    def __repr__(self):
+        return (
+            f"Diagram({len(self.groups)} groups, {len(self.components)} components, "
+            f"{len(self.connections)} connections)"
+        )
@@ -0,0 +1,258 @@
+import json
+import re
+
+from .streaming import IncrementalDiagramParser
+
+# Where the diagram object starts: a "{" opening an object with a key
+_OBJECT_START = re.compile(r'\{\s*"')
+
+_decoder = json.JSONDecoder()
+
+
+class DiagramIssue:
+    """One problem with a diagram, located by a JSON pointer into it."""
+
+    def __init__(self, path, message):
+        self.path = path
+        self.message = message
+
+    def __str__(self):
+        return f"{self.path}: {self.message}" if self.path else self.message
+
+    def __repr__(self):
+        return f"DiagramIssue({self.path!r}, {self.message!r})"
+
+
+class DiagramError(ValueError):
+    """
+    The model output is not a usable diagram.
+
+    `issues` lists every problem found. `diagram` is what could be recovered
+    (the parsed diagram when only validation failed, the objects that could be
+    salvaged when the JSON itself was broken), or None when nothing was.
+    """
+
+    def __init__(self, issues, diagram=None):
+        super().__init__("; ".join(str(issue) for issue in issues))
+        self.issues = issues
+        self.diagram = diagram
+
+
+def _repair(text, start):
+    """
+    Repair the JSON object starting at text[start] in one pass.
+
+    Drops trailing commas before "}" or "]", stops at the end of the object
+    (ignoring any prose after it) and closes strings, arrays and objects left
+    open by a truncated response.
+    """
+    out = []
+    stack = []
+    in_string = escape = False
+    comma = None  # index in out of a comma that may turn out to be trailing
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char in " \t\r\n":
+            out.append(char)
+            continue
+        if char in "}]":
+            if comma is not None:
+                out[comma] = ""
+            comma = None
+            if not stack:
+                break
+            out.append(stack.pop())
+            if not stack:
+                break
+            continue
+        comma = None
+        if char == ",":
+            comma = len(out)
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            stack.append("}")
+        elif char == "[":
+            stack.append("]")
+        out.append(char)
+    else:
+        if in_string:
+            out.append('"')
+        if comma is not None:
+            out[comma] = ""
+        out.extend(reversed(stack))
+    return "".join(out)
+
+
+def _location(text, e):
+    line = text[max(0, e.pos - 30) : e.pos + 30].replace("\n", " ")
+    return f"Invalid JSON at line {e.lineno} column {e.colno}: {e.msg} (near {line!r})"
+
+
+def _salvage(text):
+    # Recover every object that parses on its own from a broken document
+    parser = IncrementalDiagramParser()
+    parser.feed(text)
+    issues = [
+        DiagramIssue(f"/{kind}s", f"Unparseable {kind} skipped: {snippet.strip()}")
+        for kind, snippet, _ in parser.errors
+    ]
+    diagram = parser.diagram()
+    if not any(diagram.values()):
+        diagram = None
+    return diagram, issues
+
+
+def extract_diagram(text):
+    """
+    Return the diagram object in a model response, repairing it if needed.
+
+    Prose or a markdown fence around the object is skipped, then strict JSON
+    is tried, then one repair pass. Raises DiagramError carrying the original
+    error position, and any objects that could still be salvaged, if that
+    fails too.
+    """
+    match = _OBJECT_START.search(text)
+    if match is None:
+        raise DiagramError([DiagramIssue("", "No JSON object found in the response")])
+    start = match.start()
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except json.JSONDecodeError as e:
+        error = e
+    try:
+        return json.loads(_repair(text, start))
+    except json.JSONDecodeError:
+        pass
+    diagram, issues = _salvage(text[start:])
+    raise DiagramError([DiagramIssue("", _location(text, error))] + issues, diagram)
+
+
+def _check_list(diagram, key, required, issues):
+    items = diagram.get(key)
+    if items is None:
+        if required:
+            issues.append(DiagramIssue(f"/{key}", f'Missing "{key}" array'))
+        return []
+    if not isinstance(items, list):
+        issues.append(DiagramIssue(f"/{key}", f'"{key}" must be an array'))
+        return []
+    return items
+
+
+def _check_strings(item, path, required, optional, issues):
+    if not isinstance(item, dict):
+        issues.append(DiagramIssue(path, "Expected an object"))
+        return False
+    # Fields of the wrong type are reported here; callers must skip them
+    for field in required:
+        value = item.get(field)
+        if value is not None and not isinstance(value, str):
+            message = f'"{field}" must be a string'
+            issues.append(DiagramIssue(f"{path}/{field}", message))
+        elif not value:
+            issues.append(DiagramIssue(f"{path}/{field}", f'Missing "{field}"'))
+    for field in optional:
+        if item.get(field) is not None and not isinstance(item[field], str):
+            message = f'"{field}" must be a string'
+            issues.append(DiagramIssue(f"{path}/{field}", message))
+    return True
+
+
+def validate_diagram(diagram):
+    """
+    Return the list of DiagramIssues in a parsed diagram; empty if it is valid.
+
+    Checks the schema and that every component group and connection endpoint
+    names a declared group or component, with one pass over each section.
+    """
+    if not isinstance(diagram, dict):
+        return [DiagramIssue("", "The diagram must be a JSON object")]
+    issues = []
+    groups = _check_list(diagram, "groups", False, issues)
+    components = _check_list(diagram, "components", True, issues)
+    connections = _check_list(diagram, "connections", True, issues)
+
+    group_names = set()
+    for index, group in enumerate(groups):
+        path = f"/groups/{index}"
+        if _check_strings(group, path, ("name",), ("type",), issues):
+            name = group.get("name")
+            if not isinstance(name, str):
+                continue  # already reported
+            if name in group_names:
+                issues.append(DiagramIssue(path, f"Duplicate group name {name!r}"))
+            group_names.add(name)
+
+    component_names = set()
+    for index, component in enumerate(components):
+        path = f"/components/{index}"
+        optional = ("type", "group", "image")
+        if not _check_strings(component, path, ("name",), optional, issues):
+            continue
+        name = component.get("name")
+        if isinstance(name, str):
+            if name in component_names:
+                issues.append(DiagramIssue(path, f"Duplicate component name {name!r}"))
+            component_names.add(name)
+        group = component.get("group")
+        if isinstance(group, str) and group and group not in group_names:
+            issues.append(
+                DiagramIssue(
+                    f"{path}/group",
+                    f"Component {name!r} refers to unknown group {group!r}",
+                )
+            )
+
+    for index, connection in enumerate(connections):
+        path = f"/connections/{index}"
+        if not _check_strings(connection, path, ("from", "to"), ("label",), issues):
+            continue
+        for end in ("from", "to"):
+            name = connection.get(end)
+            if not isinstance(name, str) or not name:
+                continue  # already reported
+            if name not in component_names and name not in group_names:
+                issues.append(
+                    DiagramIssue(
+                        f"{path}/{end}",
+                        f"Connection {end} {name!r} is not a component or group",
+                    )
+                )
+    return issues
+
+
+def parse_diagram(text, validate=True):
+    """
+    Extract, repair and validate the diagram in a model response.
+
+    Returns the diagram in the existing JSON schema. Raises DiagramError
+    listing every problem; its `diagram` is set whenever something was
+    recovered, so the issues can be fixed with a patch (see
+    DiagramGenerator.fix_diagram) rather than a full re-generation.
+    """
+    diagram = extract_diagram(text)
+    if validate:
+        issues = validate_diagram(diagram)
+        if issues:
+            raise DiagramError(issues, diagram)
+    return diagram
+
+
+def fix_instruction(issues):
+    """An instruction asking the model for a patch fixing issues."""
+    lines = "\n".join(f"- {issue}" for issue in issues)
+    return (
+        "The diagram has these problems. Reply with a JSON Patch that fixes "
+        "all of them, keeping everything else unchanged; re-add any skipped "
+        f"objects with their intended content.\n{lines}"
+    )
@@ -0,0 +1,242 @@
+import json
+import math
+import os
+import statistics
+import tempfile
+
+# Points per inch: graphviz positions are in points, node sizes in inches
+POINTS = 72.0
+
+# Space kept between neighbouring nodes, in points (about dot's ranksep and
+# nodesep), and the node size assumed when no layout was saved
+NODE_GAP = (36.0, 22.0)
+NODE_SIZE = (86.4, 104.4)
+
+# Room left around cluster members, and above them for the label, in points
+CLUSTER_MARGIN = 8.0
+CLUSTER_LABEL = 18.0
+
+# How many rings of grid cells around its anchor a new node may be placed in
+SEARCH_RINGS = 40
+
+
+def _point(value):
+    return [float(number) for number in value.split(",")[:2]]
+
+
+class SavedLayout:
+    """
+    Node positions and cluster boxes from a completed layout.
+
+    nodes maps node IDs to [x, y, width, height] and clusters maps group
+    names (Ungrouped for the unlabelled cluster) to {"bb": [x1, y1, x2, y2],
+    "lp": [x, y]}, all in points, as graphviz reports them. strategy is the
+    name of the layout strategy that produced them.
+    """
+
+    def __init__(self, nodes=None, clusters=None, strategy=None):
+        self.nodes = nodes or {}
+        self.clusters = clusters or {}
+        self.strategy = strategy
+
+    @classmethod
+    def from_graphviz(cls, data, strategy=None):
+        """Read positions from graphviz's -Tjson output (a parsed dict)."""
+        nodes = {}
+        clusters = {}
+        for obj in data.get("objects", ()):
+            if "pos" in obj and "width" in obj:
+                x, y = _point(obj["pos"])
+                width = float(obj["width"]) * POINTS
+                height = float(obj["height"]) * POINTS
+                nodes[obj["name"]] = [x, y, width, height]
+            elif obj.get("name", "").startswith("cluster") and "bb" in obj:
+                cluster = {"bb": [float(n) for n in obj["bb"].split(",")]}
+                if obj.get("lp"):
+                    cluster["lp"] = _point(obj["lp"])
+                clusters[obj.get("label") or "Ungrouped"] = cluster
+        return cls(nodes, clusters, strategy)
+
+    @classmethod
+    def load(cls, path):
+        """Read a layout written by save(); ValueError if it is not one."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        try:
+            nodes = {
+                name: [float(n) for n in box] for name, box in data["nodes"].items()
+            }
+            clusters = {}
+            for group, cluster in data["clusters"].items():
+                clusters[group] = {"bb": [float(n) for n in cluster["bb"]]}
+                if "lp" in cluster:
+                    clusters[group]["lp"] = [float(n) for n in cluster["lp"]]
+            strategy = data.get("strategy")
+        except (AttributeError, TypeError):
+            raise ValueError(f"{path} is not a saved layout") from None
+        if any(len(box) != 4 for box in nodes.values()) or any(
+            len(c["bb"]) != 4 or len(c.get("lp", ())) not in (0, 2)
+            for c in clusters.values()
+        ):
+            raise ValueError(f"{path} is not a saved layout")
+        return cls(nodes, clusters, strategy)
+
+    def save(self, path):
+        """Write the layout to path atomically."""
+        data = {
+            "strategy": self.strategy,
+            "nodes": self.nodes,
+            "clusters": self.clusters,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def node_size(self):
+        # Typical node width and height, given to new nodes
+        if not self.nodes:
+            return NODE_SIZE
+        boxes = self.nodes.values()
+        return (
+            statistics.median(box[2] for box in boxes),
+            statistics.median(box[3] for box in boxes),
+        )
+
+    def place(self, nodes, edges, groups):
+        """
+        Position every node of a changed diagram.
+
+        nodes lists the node IDs now drawn, edges their (from, to) pairs and
+        groups maps a node ID to its cluster's group name, or None. Saved
+        nodes keep their positions. Each new node goes on a free cell of a
+        grid of typical node spacing, as close as possible to its already
+        placed neighbours, else to its cluster, else to the right of the
+        drawing, where neither it nor its grown cluster overlaps another
+        group's cluster.
+
+        Returns a SavedLayout of the result, to pin with and save.
+        """
+        size = list(self.node_size())
+        step_x, step_y = size[0] + NODE_GAP[0], size[1] + NODE_GAP[1]
+        placed = {name: self.nodes[name] for name in nodes if name in self.nodes}
+        occupied = set()
+        for box in placed.values():
+            # Every cell nearer than one step, so new nodes keep clear of it
+            fx, fy = box[0] / step_x, box[1] / step_y
+            occupied.update(
+                (cx, cy)
+                for cx in range(math.floor(fx), math.ceil(fx) + 1)
+                for cy in range(math.floor(fy), math.ceil(fy) + 1)
+                if abs(cx - fx) < 1 and abs(cy - fy) < 1
+            )
+        neighbours = {}
+        for source, target in edges:
+            neighbours.setdefault(source, []).append(target)
+            neighbours.setdefault(target, []).append(source)
+        if placed:
+            right = max(box[0] + box[2] / 2 for box in placed.values()) + step_x
+            top = max(box[1] for box in placed.values())
+        else:
+            right, top = 0.0, 0.0
+
+        # Current box of each group's cluster: its saved box, grown as members
+        # are placed
+        extents = {
+            group: list(cluster["bb"])
+            for group, cluster in self.clusters.items()
+            if group in groups.values()
+        }
+
+        def anchor(name):
+            near = [placed[n] for n in neighbours.get(name, ()) if n in placed]
+            if not near:
+                group = groups.get(name)
+                near = [box for n, box in placed.items() if groups.get(n) == group]
+            if not near and groups.get(name) in extents:
+                x1, y1, x2, y2 = extents[groups[name]]
+                return (x1 + x2) / 2, (y1 + y2) / 2
+            if not near:
+                return right, top
+            return (
+                sum(box[0] for box in near) / len(near),
+                sum(box[1] for box in near) / len(near),
+            )
+
+        def grown(group, x, y):
+            # The cluster box of group with a node added at x, y
+            label = CLUSTER_LABEL if group != "Ungrouped" else 0.0
+            box = [
+                x - size[0] / 2 - CLUSTER_MARGIN,
+                y - size[1] / 2 - CLUSTER_MARGIN,
+                x + size[0] / 2 + CLUSTER_MARGIN,
+                y + size[1] / 2 + CLUSTER_MARGIN + label,
+            ]
+            extent = extents.get(group)
+            if extent is None:
+                return box
+            return [
+                min(extent[0], box[0]),
+                min(extent[1], box[1]),
+                max(extent[2], box[2]),
+                max(extent[3], box[3]),
+            ]
+
+        def foreign(group, x, y):
+            # The node, or its cluster grown to hold it, would overlap another
+            # group's cluster
+            box = grown(group, x, y)
+            return any(
+                other != group
+                and box[0] < extent[2]
+                and extent[0] < box[2]
+                and box[1] < extent[3]
+                and extent[1] < box[3]
+                for other, extent in extents.items()
+            )
+
+        def free_cell(name, x, y):
+            cx, cy = round(x / step_x), round(y / step_y)
+            group = groups.get(name)
+            for ring in range(SEARCH_RINGS + 1):
+                cells = [
+                    (cx + dx, cy + dy)
+                    for dx in range(-ring, ring + 1)
+                    for dy in range(-ring, ring + 1)
+                    if max(abs(dx), abs(dy)) == ring
+                ]
+                cells.sort(key=lambda c: math.hypot(c[0] - cx, c[1] - cy))
+                for cell in cells:
+                    px, py = cell[0] * step_x, cell[1] * step_y
+                    if cell not in occupied and not foreign(group, px, py):
+                        return cell
+            # Crowded: beyond everything on the right
+            return (round(right / step_x) + len(occupied), cy)
+
+        new = [name for name in nodes if name not in placed]
+        while new:
+            # Nodes with the most placed neighbours first, so chains of new
+            # nodes grow out from the existing drawing
+            name = max(
+                new,
+                key=lambda n: sum(m in placed for m in neighbours.get(n, ())),
+            )
+            new.remove(name)
+            cell = free_cell(name, *anchor(name))
+            occupied.add(cell)
+            placed[name] = [cell[0] * step_x, cell[1] * step_y] + size
+            group = groups.get(name)
+            if group is not None:
+                extents[group] = grown(group, *placed[name][:2])
+
+        clusters = {}
+        for group, bb in extents.items():
+            saved = self.clusters.get(group)
+            cluster = {"bb": bb}
+            if saved is not None and saved["bb"] == bb and "lp" in saved:
+                cluster["lp"] = saved["lp"]
+            elif group != "Ungrouped":
+                cluster["lp"] = [(bb[0] + bb[2]) / 2, bb[3] - CLUSTER_LABEL / 2]
+            clusters[group] = cluster
+        return SavedLayout(placed, clusters, self.strategy)
@@ -0,0 +1,208 @@
+import json
+import os
+
+from .image_index import get_image_index
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CATALOG_MODES = ("full", "filtered")
+
+# Icons offered to the model whatever the description says
+ALWAYS_INCLUDE = ("user.png",)
+
+SYSTEM_PROMPT = "You are a technical diagram generator that outputs only valid JSON."
+
+EXAMPLE_DESCRIPTION = (
+    "A web application using AWS. It has a React frontend hosted on S3, an API "
+    "Gateway connecting to Lambda functions, and a DynamoDB database. CloudFront "
+    "is used as a CDN."
+)
+
+EXAMPLE_DIAGRAM = {
+    "groups": [
+        {"name": "AWS", "type": "cloud_provider"},
+        {"name": "Frontend", "type": "client_side"},
+    ],
+    "components": [
+        {
+            "name": "React App",
+            "type": "frontend_framework",
+            "group": "Frontend",
+            "image": "react.png",
+        },
+        {
+            "name": "S3 Bucket",
+            "type": "object_storage",
+            "group": "AWS",
+            "image": "aws-s3.png",
+        },
+        {
+            "name": "CloudFront",
+            "type": "cdn",
+            "group": "AWS",
+            "image": "aws-cloudfront.png",
+        },
+        {
+            "name": "API Gateway",
+            "type": "api_management",
+            "group": "AWS",
+            "image": "aws-api-gateway.png",
+        },
+        {
+            "name": "Lambda",
+            "type": "serverless_function",
+            "group": "AWS",
+            "image": "aws-lambda.png",
+        },
+        {
+            "name": "DynamoDB",
+            "type": "nosql_database",
+            "group": "AWS",
+            "image": "aws-dynamodb.png",
+        },
+    ],
+    "connections": [
+        {"from": "React App", "to": "CloudFront", "label": "user access"},
+        {"from": "CloudFront", "to": "S3 Bucket", "label": "origin"},
+        {"from": "React App", "to": "API Gateway", "label": "API calls"},
+        {"from": "API Gateway", "to": "Lambda", "label": "triggers"},
+        {"from": "Lambda", "to": "DynamoDB", "label": "read/write"},
+    ],
+}
+
+PROMPT_TEMPLATE = """Generate a JSON representation of a system architecture based on the following description:
+
+{description}
+
+The JSON should strictly adhere to the following structure and guidelines:
+
+1. Groups: Categorize components into logical groups (e.g., cloud providers, data sources, user types).
+2. Components: List all system components with their details.
+3. Connections: Describe how components are connected or interact.
+
+Use the following schema:
+
+{{
+    "groups": [
+        {{
+            "name": "group_name",
+            "type": "group_type" // e.g., "cloud_provider", "data_source", "user_group", etc.
+        }}
+    ],
+    "components": [
+        {{
+            "name": "component_name",
+            "type": "component_type",
+            "group": "group_name",
+            "image": "image_filename.png"
+        }}
+    ],
+    "connections": [
+        {{
+            "from": "component_name1",
+            "to": "component_name2",
+            "label": "connection_description"
+        }}
+    ]
+}}
+
+List of available images:
+{images}
+
+Image Naming Guidelines:
+1. For specific cloud services, use "[provider]-[service].png" (e.g., "aws-lambda.png", "azure-sql-database.png").
+2. For generic services, use descriptive names (e.g., "database.png", "api.png", "server.png").
+3. For user roles always use "user.png".
+4. If unsure, use a generic term related to the component type.
+
+Example:
+Given the description: "{example_description}"
+
+The JSON output should be:
+
+{example}
+
+Ensure your output is a valid JSON object containing only the requested structure.
+Do not include any explanatory text or markdown formatting."""
+
+# The template split around its two per-request fields, rendered once at import
+_BEFORE_DESCRIPTION, _BEFORE_IMAGES, _AFTER_IMAGES = PROMPT_TEMPLATE.format(
+    description="\0",
+    images="\0",
+    example_description=EXAMPLE_DESCRIPTION,
+    example=json.dumps(EXAMPLE_DIAGRAM),
+).split("\0")
+
+
+def count_tokens(text, model="gpt-4"):
+    """Count tokens with tiktoken when installed, else estimate ~4 characters each."""
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text))
+
+
+class PromptBuilder:
+    """
+    Renders the generation prompt for a description.
+
+    In "full" mode the whole image catalog is listed; in "filtered" mode only
+    the top_k icons whose names share words with the description (plus
+    ALWAYS_INCLUDE) are. Either way the list is a comma-separated line rather
+    than a Python repr. render() also returns a summary of what was sent; the
+    builder keeps no per-call state, so threads can share one.
+    """
+
+    def __init__(self, image_directory="images", catalog_mode=None, top_k=40):
+        catalog_mode = catalog_mode or os.getenv("AI_ARCHITECT_CATALOG_MODE") or "full"
+        if catalog_mode not in CATALOG_MODES:
+            raise ValueError(
+                f"catalog_mode must be one of {CATALOG_MODES}, got {catalog_mode!r}"
+            )
+        self.image_directory = image_directory
+        self.catalog_mode = catalog_mode
+        self.top_k = top_k
+
+    def select_images(self, description):
+        index = get_image_index(self.image_directory)
+        if self.catalog_mode == "full":
+            return list(index.filenames)
+        selected = index.search(description, self.top_k)
+        for filename in ALWAYS_INCLUDE:
+            if filename in index and filename not in selected:
+                selected.append(filename)
+        return selected
+
+    def build(self, description, model="gpt-4"):
+        return self._compose(description)[0]
+
+    def render(self, description, model="gpt-4"):
+        """Return (prompt, report): catalog mode, image count, prompt tokens."""
+        prompt, images = self._compose(description)
+        report = {
+            "catalog_mode": self.catalog_mode,
+            "images": len(images),
+            "prompt_tokens": count_tokens(SYSTEM_PROMPT, model)
+            + count_tokens(prompt, model),
+        }
+        return prompt, report
+
+    def _compose(self, description):
+        # The prompt and the images it lists; tokens are only counted on request
+        images = self.select_images(description)
+        prompt = "".join(
+            (
+                _BEFORE_DESCRIPTION,
+                description,
+                _BEFORE_IMAGES,
+                ", ".join(images),
+                _AFTER_IMAGES,
+            )
+        )
+        return prompt, images
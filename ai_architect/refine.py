@@ -0,0 +1,207 @@
+import copy
+import json
+
+from .parser import validate_diagram
+from .prompt import SYSTEM_PROMPT
+
+PATCH_PROMPT = """You are editing an existing system architecture diagram.
+
+Current diagram:
+
+{diagram}
+
+For each instruction that follows, reply with only a JSON Patch (RFC 6902) array
+of operations that changes the current diagram as requested, for example:
+
+[
+    {{"op": "add", "path": "/components/-", "value": {{"name": "Cache", "type": "cache", "group": "AWS", "image": "redis.png"}}}},
+    {{"op": "replace", "path": "/components/name=Lambda/image", "value": "aws-lambda.png"}},
+    {{"op": "remove", "path": "/connections/from=API Gateway&to=Lambda"}}
+]
+
+Supported operations are add, remove, replace, move, copy and test. Array items
+may be addressed by index or by matching fields, e.g. "name=Lambda" or
+"from=A&to=B". Keep every connection endpoint a component or group name.
+Later instructions apply to the diagram as changed by your earlier patches.
+Do not include any explanatory text or markdown formatting."""
+
+
+class PatchError(ValueError):
+    """A patch could not be parsed or applied, or left the diagram invalid."""
+
+
+def _parse_pointer(path):
+    if not isinstance(path, str):
+        raise PatchError(f"Invalid JSON pointer {path!r}")
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer {path!r}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+
+def _array_index(array, part, allow_end=False):
+    if part == "-" and allow_end:
+        return len(array)
+    if "=" in part:
+        items = part.split("&")
+        if not all("=" in item for item in items):
+            raise PatchError(f"Invalid item criteria {part!r}")
+        criteria = dict(item.split("=", 1) for item in items)
+        for index, item in enumerate(array):
+            if isinstance(item, dict) and all(
+                str(item.get(key)) == value for key, value in criteria.items()
+            ):
+                return index
+        raise PatchError(f"No item matches {part!r}")
+    try:
+        index = int(part)
+    except ValueError:
+        raise PatchError(f"Invalid array index {part!r}") from None
+    if not 0 <= index <= (len(array) if allow_end else len(array) - 1):
+        raise PatchError(f"Array index {index} out of range")
+    return index
+
+
+def _resolve(document, parts):
+    # Return the container holding the target of parts, and the target's key
+    if not parts:
+        raise PatchError("Operations on the whole document are not supported")
+    node = document
+    for part in parts[:-1]:
+        if isinstance(node, list):
+            node = node[_array_index(node, part)]
+        elif isinstance(node, dict) and part in node:
+            node = node[part]
+        else:
+            raise PatchError(f"Path segment {part!r} not found")
+    if not isinstance(node, (list, dict)):
+        # Below a string or number: nothing there to get, add or remove
+        raise PatchError(f"Path segment {parts[-1]!r} not found")
+    return node, parts[-1]
+
+
+def _get(document, parts):
+    if not parts:
+        return document
+    container, key = _resolve(document, parts)
+    if isinstance(container, list):
+        return container[_array_index(container, key)]
+    if key not in container:
+        raise PatchError(f"Path segment {key!r} not found")
+    return container[key]
+
+
+def _remove(document, parts):
+    container, key = _resolve(document, parts)
+    if isinstance(container, list):
+        return container.pop(_array_index(container, key))
+    if key not in container:
+        raise PatchError(f"Path segment {key!r} not found")
+    return container.pop(key)
+
+
+def _add(document, parts, value):
+    container, key = _resolve(document, parts)
+    if isinstance(container, list):
+        container.insert(_array_index(container, key, allow_end=True), value)
+    else:
+        container[key] = value
+
+
+def apply_patch(diagram, operations):
+    """Return a copy of diagram with JSON Patch operations applied."""
+    document = copy.deepcopy(diagram)
+    for operation in operations:
+        try:
+            op = operation["op"]
+            parts = _parse_pointer(operation["path"])
+        except (KeyError, TypeError):
+            raise PatchError(f"Malformed operation {operation!r}") from None
+        if not parts and op != "test":
+            raise PatchError("Operations on the whole document are not supported")
+
+        if op == "add":
+            _add(document, parts, operation.get("value"))
+        elif op == "remove":
+            _remove(document, parts)
+        elif op == "replace":
+            container, key = _resolve(document, parts)
+            if isinstance(container, list):
+                container[_array_index(container, key)] = operation.get("value")
+            elif key in container:
+                container[key] = operation.get("value")
+            else:
+                raise PatchError(f"Path segment {key!r} not found")
+        elif op in ("move", "copy"):
+            if "from" not in operation:
+                raise PatchError(f"Malformed operation {operation!r}")
+            source = _parse_pointer(operation["from"])
+            if op == "move":
+                value = _remove(document, source)
+            else:
+                value = copy.deepcopy(_get(document, source))
+            _add(document, parts, value)
+        elif op == "test":
+            if _get(document, parts) != operation.get("value"):
+                raise PatchError(f"Test failed at {operation['path']!r}")
+        else:
+            raise PatchError(f"Unsupported operation {op!r}")
+    return document
+
+
+def check_references(diagram):
+    """Return a list of problems with names and references in a diagram."""
+    # Messages name the items involved but not their positions, so problems
+    # can be compared before and after a patch that moves items around
+    return [issue.message for issue in validate_diagram(diagram)]
+
+
+def parse_patch(text):
+    """Extract the list of operations from a model response."""
+    start = text.find("[")
+    end = text.rfind("]")
+    if start == -1 or end < start:
+        raise PatchError("No JSON Patch array found in the response")
+    try:
+        operations = json.loads(text[start : end + 1])
+    except json.JSONDecodeError as e:
+        raise PatchError(f"Invalid JSON Patch: {e}") from e
+    if not isinstance(operations, list):
+        raise PatchError("JSON Patch must be an array of operations")
+    return operations
+
+
+class DiagramSession:
+    """
+    Chained refinement of a diagram through compact patches.
+
+    The first request carries the full diagram; every refine() call afterwards
+    only adds the instruction and the model's patch to the conversation, and
+    the patch is applied and validated locally. A patch that fails, or that
+    introduces a dangling reference, leaves both the diagram and the
+    conversation unchanged.
+    """
+
+    def __init__(self, generator, diagram):
+        self.generator = generator
+        self.diagram = diagram
+        self.messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": PATCH_PROMPT.format(diagram=json.dumps(diagram)),
+            },
+        ]
+
+    def refine(self, instruction):
+        messages = self.messages + [{"role": "user", "content": instruction}]
+        content = self.generator.complete(messages)
+        diagram = apply_patch(self.diagram, parse_patch(content))
+        existing = set(check_references(self.diagram))
+        errors = [e for e in check_references(diagram) if e not in existing]
+        if errors:
+            raise PatchError("; ".join(errors))
+        self.messages = messages + [{"role": "assistant", "content": content}]
+        self.diagram = diagram
+        return diagram
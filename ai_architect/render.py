@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+
+import graphviz
+
+from .cache import RenderCache
+from .layout import STRATEGIES
+from .metrics import configure_from_env
+from .model import Diagram
+from .parser import DiagramError
+from .visualiser import DiagramVisualiser
+
+# Import time of this module in a fresh interpreter, over that of the bare
+# interpreter, that test/benchmark.py checks against (seconds)
+COLD_START_TARGET = 0.15
+
+
+def main():
+    """
+    Render one existing diagram JSON file.
+
+    Only the render stack is imported: no openai SDK and no API key needed.
+    """
+    parser = argparse.ArgumentParser(
+        description="Render an existing diagram JSON file, without a model call."
+    )
+    parser.add_argument("input", help="Diagram JSON file, or - for stdin")
+    parser.add_argument(
+        "-o", "--output", help="Output path without extension (default: input's)"
+    )
+    parser.add_argument(
+        "-f", "--format", default="png", help="Format, or several: png,svg,pdf"
+    )
+    parser.add_argument("-t", "--timeout", type=float, default=None)
+    parser.add_argument("--images", default="images", help="Image directory")
+    parser.add_argument(
+        "--layout", default="auto", choices=["auto", *STRATEGIES], help="Layout"
+    )
+    parser.add_argument(
+        "--stream", action="store_true", help="Pipe DOT to the engine as built"
+    )
+    parser.add_argument(
+        "--embed-icons", action="store_true", help="Inline icons into SVG output"
+    )
+    parser.add_argument(
+        "--layout-file",
+        help="Saved layout JSON: reused with new nodes placed around it if it "
+        "exists, written after rendering",
+    )
+    parser.add_argument("--view", action="store_true", help="Open the result")
+    args = parser.parse_args()
+
+    configure_from_env()
+    if args.input == "-":
+        text = sys.stdin.read()
+        output = args.output or "diagram"
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            text = f.read()
+        output = args.output
+        if output is None:
+            output = os.path.splitext(args.input)[0]
+            if output == args.input:
+                output += ".diagram"  # no extension: keep clear of the input
+        # The DOT source is saved at the output path itself
+        if os.path.abspath(output) == os.path.abspath(args.input):
+            parser.error("the output path would overwrite the input file")
+    try:
+        diagram = Diagram.from_json(text)
+    except DiagramError as e:
+        print("Invalid diagram:", file=sys.stderr)
+        for issue in e.issues:
+            print(f"  {issue}", file=sys.stderr)
+        sys.exit(1)
+
+    visualiser = DiagramVisualiser(
+        diagram, args.images, RenderCache.from_env(), args.layout
+    )
+    formats = args.format.split(",")
+    paths = visualiser.render_formats(
+        output,
+        formats,
+        timeout=args.timeout,
+        stream=args.stream,
+        embed_icons=args.embed_icons,
+        layout_file=args.layout_file,
+    )
+    for path in paths.values():
+        print(path)
+    if args.view:
+        graphviz.view(paths[formats[0]])
+
+
+if __name__ == "__main__":
+    main()
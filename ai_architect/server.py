@@ -0,0 +1,345 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import traceback
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import APIError
+
+from .cache import RenderCache, ResponseCache
+from .engine import DotPool, RenderError, RenderTimeout
+from .generator import DiagramGenerator, ModelLadder, load_env
+from .layout import STRATEGIES
+from .metrics import configure_from_env, metrics
+from .parser import DiagramError, validate_diagram
+from .visualiser import DiagramVisualiser
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+    "jpg": "image/jpeg",
+    "gif": "image/gif",
+}
+
+# Largest request body accepted, in bytes
+MAX_BODY = 4 * 1024 * 1024
+
+
+class Coalescer:
+    """
+    Run identical concurrent calls once.
+
+    The first run(key, fn) call for a key calls fn; calls with the same key
+    made while it is running wait for it and get its result or exception.
+    Nothing is kept once the call finishes, so this is not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future of the running call
+
+    def run(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            metrics.record("coalesced", 0.0)
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def _digest(*parts):
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class DiagramService:
+    """
+    Generation and rendering shared by every request of a long-running server.
+
+    One DiagramGenerator, and so one OpenAI client and its connection pool,
+    serves all requests. At most `max_renders` layout engines run at once,
+    through a DotPool of warm processes. Identical requests arriving while
+    one is in flight share its model call or render instead of repeating it.
+    """
+
+    def __init__(
+        self,
+        generator=None,
+        image_directory="images",
+        max_renders=2,
+        render_timeout=60,
+        render_cache=None,
+        layout="auto",
+    ):
+        self.generator = generator if generator is not None else DiagramGenerator()
+        self.image_directory = image_directory
+        self.render_timeout = render_timeout
+        self.render_cache = render_cache
+        self.layout = layout
+        self.pool = DotPool(size=max_renders, timeout=render_timeout)
+        # The pool only bounds the formats it keeps warm processes for
+        self._renders = threading.BoundedSemaphore(max_renders)
+        self._generations = Coalescer()
+        self._images = Coalescer()
+
+    def generate(self, description):
+        """Return the validated diagram dict for description."""
+        key = _digest(self.generator.model, description)
+        return self._generations.run(
+            key, lambda: self.generator.generate_valid_diagram(description)
+        )
+
+    def render(self, diagram, format="png", layout=None):
+        """Return the image bytes for a diagram dict."""
+        issues = validate_diagram(diagram)
+        if issues:
+            raise DiagramError(issues, diagram)
+        layout = layout or self.layout
+        key = _digest(diagram, format, layout)
+        return self._images.run(key, lambda: self._render(diagram, format, layout))
+
+    def _render(self, diagram, format, layout):
+        visualiser = DiagramVisualiser(
+            diagram, self.image_directory, self.render_cache, layout
+        )
+        with self._renders:
+            return visualiser.render_bytes(
+                format, timeout=self.render_timeout, pool=self.pool
+            )
+
+    def generate_render(self, description, format="png", layout=None):
+        return self.render(self.generate(description), format, layout)
+
+    def close(self):
+        self.pool.close()
+
+
+class RequestError(Exception):
+    def __init__(self, status, message, issues=()):
+        super().__init__(message)
+        self.status = status
+        self.issues = issues
+
+
+def _field(body, name, types=str):
+    value = body.get(name)
+    if not isinstance(value, types) or not value:
+        raise RequestError(400, f'"{name}" is required')
+    return value
+
+
+def _format(body):
+    format = body.get("format") or "png"
+    if format not in CONTENT_TYPES:
+        raise RequestError(400, f"Unsupported format {format!r}")
+    return format
+
+
+def _layout(body):
+    layout = body.get("layout")
+    if layout is not None and layout != "auto" and layout not in STRATEGIES:
+        raise RequestError(400, f"Unknown layout {layout!r}")
+    return layout
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        """
+        POST /generate          {"description"}             -> diagram JSON
+        POST /render            {"diagram", "format"}       -> image
+        POST /generate-render   {"description", "format"}   -> image
+        GET  /health, GET /metrics (Prometheus text)
+
+        "format" defaults to png; "layout" may name a layout strategy.
+        """
+
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                text = metrics.prometheus_text().encode("utf-8")
+                self._send(200, text, "text/plain; version=0.0.4")
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            try:
+                body = self._read_json()
+                if self.path == "/generate":
+                    diagram = service.generate(_field(body, "description"))
+                    self._send_json(200, diagram)
+                elif self.path == "/render":
+                    format = _format(body)
+                    data = service.render(
+                        _field(body, "diagram", dict), format, _layout(body)
+                    )
+                    self._send(200, data, CONTENT_TYPES[format])
+                elif self.path == "/generate-render":
+                    format = _format(body)
+                    data = service.generate_render(
+                        _field(body, "description"), format, _layout(body)
+                    )
+                    self._send(200, data, CONTENT_TYPES[format])
+                else:
+                    raise RequestError(404, "Not found")
+            except RequestError as e:
+                self._send_error(e.status, str(e), e.issues)
+            except DiagramError as e:
+                self._send_error(422, "Invalid diagram", e.issues)
+            except RenderTimeout as e:
+                self._send_error(504, str(e))
+            except RenderError as e:
+                self._send_error(500, str(e))
+            except APIError as e:
+                # The model API failed or could not be reached
+                self._send_error(502, f"{type(e).__name__}: {e}")
+            except Exception:
+                self.log_error("Internal error handling %s", self.path)
+                traceback.print_exc()
+                self._send_error(500, "Internal server error")
+
+        def _read_json(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                length = -1
+            if length < 0 or length > MAX_BODY:
+                # The body is not read, so the connection cannot be reused
+                self.close_connection = True
+                if length < 0:
+                    raise RequestError(400, "Invalid Content-Length")
+                raise RequestError(413, "Request body too large")
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                raise RequestError(400, "Request body is not valid JSON") from None
+            if not isinstance(body, dict):
+                raise RequestError(400, "Request body must be a JSON object")
+            return body
+
+        def _send(self, status, data, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if self.close_connection:
+                self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self._send(status, data, "application/json")
+
+        def _send_error(self, status, message, issues=()):
+            payload = {"error": message}
+            if issues:
+                payload["issues"] = [str(issue) for issue in issues]
+            self._send_json(status, payload)
+
+    return Handler
+
+
+class DiagramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, make_handler(service))
+
+    def server_close(self):
+        super().server_close()
+        self.service.close()
+
+
+def main():
+    load_env()
+    parser = argparse.ArgumentParser(
+        description="Serve diagram generation and rendering over HTTP."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument(
+        "--models",
+        help='Model ladder, fastest first, e.g. "gpt-4o-mini:400,gpt-4" '
+        "(default: AI_ARCHITECT_MODELS)",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=os.getenv("OPENAI_BASE_URL"),
+        help="OpenAI-compatible API base URL",
+    )
+    parser.add_argument("--images", default="images", help="Image directory")
+    parser.add_argument(
+        "-j", "--max-renders", type=int, default=2, help="Concurrent renders"
+    )
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=60, help="Seconds per render"
+    )
+    parser.add_argument(
+        "--layout", default="auto", choices=["auto", *STRATEGIES], help="Layout"
+    )
+    args = parser.parse_args()
+
+    configure_from_env()
+    client = None
+    if args.base_url:
+        from openai import OpenAI
+
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=args.base_url)
+    if args.models:
+        ladder = ModelLadder.parse(args.models)
+    else:
+        ladder = ModelLadder.from_env()
+    generator = DiagramGenerator(
+        model=args.model,
+        cache=ResponseCache.from_env(),
+        image_directory=args.images,
+        client=client,
+        ladder=ladder,
+    )
+    service = DiagramService(
+        generator,
+        image_directory=args.images,
+        max_renders=args.max_renders,
+        render_timeout=args.timeout,
+        render_cache=RenderCache.from_env(),
+        layout=args.layout,
+    )
+    server = DiagramServer((args.host, args.port), service)
+    host, port = server.server_address[:2]
+    print(f"Serving diagrams on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import json
+import re
+
+# Top-level array key -> event kind yielded for each object in it
+SECTIONS = {"groups": "group", "components": "component", "connections": "connection"}
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class IncrementalDiagramParser:
+    """
+    Incremental parser for the diagram JSON as it streams from the model.
+
+    feed() takes arbitrary text chunks and returns the (kind, object) events
+    completed by that chunk, where kind is "group", "component" or
+    "connection". Each object is emitted as soon as its closing brace arrives,
+    long before the whole document is complete. Text before the first "{"
+    (prose, a markdown fence) is ignored. Objects that are not valid JSON even
+    after dropping trailing commas are collected in `errors` and skipped.
+    """
+
+    def __init__(self):
+        self.groups = []
+        self.components = []
+        self.connections = []
+        self.errors = []
+        self.done = False
+
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._key = []  # characters of the current string at depth 1
+        self._last_key = None
+        self._section = None  # event kind of the array being read, if any
+        self._object = []  # characters of the object being captured
+
+    def feed(self, chunk):
+        events = []
+        for char in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            capturing = self._section is not None and self._depth >= 3
+            if capturing:
+                self._object.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = "".join(self._key)
+                if self._depth == 1 and self._in_string:
+                    self._key.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._key = []
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 2 and char == "[":
+                    self._section = SECTIONS.get(self._last_key)
+                elif self._depth == 3 and self._section is not None:
+                    self._object = ["{"] if char == "{" else []
+            elif char in "}]":
+                self._depth -= 1
+                if capturing and self._depth == 2:
+                    event = self._finish_object()
+                    if event:
+                        events.append(event)
+                elif self._depth == 1:
+                    self._section = None
+                elif self._depth == 0:
+                    self.done = True
+        return events
+
+    def diagram(self):
+        return {
+            "groups": self.groups,
+            "components": self.components,
+            "connections": self.connections,
+        }
+
+    def _finish_object(self):
+        text = "".join(self._object)
+        self._object = []
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                obj = json.loads(_TRAILING_COMMA.sub(r"\1", text))
+            except json.JSONDecodeError as e:
+                self.errors.append((self._section, text, e))
+                return None
+        if not isinstance(obj, dict):
+            return None
+        getattr(self, f"{self._section}s").append(obj)
+        return self._section, obj
+
+
+class DiagramStream:
+    """
+    Iterable over the (kind, object) events of a streamed diagram.
+
+    Iterating drives the underlying completion; on_event, if given, is called
+    with each event as well. After iteration `text` holds the raw response and
+    `diagram` the objects seen so far, in the existing JSON schema.
+    """
+
+    def __init__(self, chunks, on_event=None, on_complete=None):
+        self._chunks = chunks
+        self.on_event = on_event
+        self._on_complete = on_complete
+        self.parser = IncrementalDiagramParser()
+        self._text = []
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            self._text.append(chunk)
+            for event in self.parser.feed(chunk):
+                if self.on_event is not None:
+                    self.on_event(*event)
+                yield event
+        if self._on_complete is not None:
+            self._on_complete(self.text)
+            self._on_complete = None
+
+    def consume(self):
+        """Drain the stream and return the assembled diagram."""
+        for _ in self:
+            pass
+        return self.diagram
+
+    @property
+    def text(self):
+        return "".join(self._text)
+
+    @property
+    def diagram(self):
+        return self.parser.diagram()
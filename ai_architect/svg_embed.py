@@ -0,0 +1,87 @@
+import base64
+import mimetypes
+import os
+import re
+
+# graphviz writes each IMG / image= as one self-closing <image .../> element
+_IMAGE_TAG = re.compile(rb"<image\b([^>]*?)/>")
+_ATTRIBUTE = re.compile(rb'([\w:-]+)="([^"]*)"')
+_SVG_TAG = re.compile(rb"<svg\b[^>]*>")
+_NUMBER = re.compile(rb"[-+]?[0-9.]+")
+
+
+def _data_uri(path):
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        data = base64.b64encode(f.read()).decode("ascii")
+    return f"data:{mime};base64,{data}".encode("ascii")
+
+
+def _read_icon(href, directories):
+    for directory in directories:
+        try:
+            return _data_uri(os.path.join(directory, href))
+        except OSError:
+            continue
+    return None
+
+
+def embed_icons(svg, base_directory=".", imagepath=()):
+    """
+    Return svg (bytes) with every linked icon embedded once.
+
+    Each distinct file referenced by an <image> element becomes a <symbol>
+    holding it as a base64 data URI, and every <image> that used the file is
+    replaced by a <use> of that symbol at the same position and size. The
+    result no longer depends on the image directory and carries each icon's
+    bytes once however many nodes show it. Relative paths are resolved
+    against base_directory, the layout engine's working directory, then
+    against each directory of imagepath, as graphviz's imagepath attribute
+    resolves bare filenames; images that cannot be read are left as links.
+    """
+    symbols = {}  # href -> (symbol id, <symbol> element)
+
+    def replace(match):
+        attrs = dict(_ATTRIBUTE.findall(match.group(1)))
+        href = attrs.get(b"xlink:href") or attrs.get(b"href")
+        if not href or href.startswith(b"data:"):
+            return match.group(0)
+        width = _NUMBER.match(attrs.get(b"width", b""))
+        height = _NUMBER.match(attrs.get(b"height", b""))
+        if not (width and height):
+            return match.group(0)
+        width, height = width.group(), height.group()
+
+        if href not in symbols:
+            uri = _read_icon(href.decode("utf-8"), (base_directory, *imagepath))
+            if uri is None:
+                return match.group(0)
+            symbol_id = b"icon-%d" % len(symbols)
+            aspect = attrs.get(b"preserveAspectRatio", b"xMidYMid meet")
+            symbols[href] = (
+                symbol_id,
+                b'<symbol id="%s" viewBox="0 0 %s %s" preserveAspectRatio="%s">'
+                b'<image xlink:href="%s" width="%s" height="%s"/></symbol>'
+                % (symbol_id, width, height, aspect, uri, width, height),
+            )
+        symbol_id = symbols[href][0]
+        return b'<use xlink:href="#%s" x="%s" y="%s" width="%s" height="%s"/>' % (
+            symbol_id,
+            attrs.get(b"x", b"0"),
+            attrs.get(b"y", b"0"),
+            width,
+            height,
+        )
+
+    svg = _IMAGE_TAG.sub(replace, svg)
+    if not symbols:
+        return svg
+    root = _SVG_TAG.search(svg)
+    if root is None:
+        return svg
+    if b"xmlns:xlink" not in root.group():
+        opening = root.group()[:-1] + b' xmlns:xlink="http://www.w3.org/1999/xlink">'
+    else:
+        opening = root.group()
+    defs = b"\n<defs>\n%s\n</defs>" % b"\n".join(s for _, s in symbols.values())
+    return svg[: root.start()] + opening + defs + svg[root.end() :]
@@ -1,21 +1,49 @@
+import json
 import os
-import difflib
+import tempfile
+import time
+import graphviz
 from graphviz import Digraph
 import html
 
+from .dot_writer import DotWriter
+from .engine import RenderError, RenderTimeout, run_dot
+from .image_index import get_image_index
+from .layout import STRATEGIES, fallback_chain, get_strategy
+from .metrics import metrics
+from .model import Connection, Diagram
+from .pinned import SavedLayout
+from . import svg_embed
+
+# Width and height, in pixels, of the cell an icon is drawn in
+ICON_CELL_SIZE = (80, 80)
+
 
 class DiagramVisualiser:
-    def __init__(self, data, image_directory="images"):
+    def __init__(
+        self,
+        data,
+        image_directory="images",
+        render_cache=None,
+        layout="auto",
+        collapse=False,
+    ):
         self.data = data
         self.image_directory = image_directory
-        self.components = data["components"]
-        self.connections = data["connections"]
-        self.groups = data.get("groups", [])
+        self.render_cache = render_cache
+        self.layout = layout  # "auto", a name in layout.STRATEGIES or a strategy
+        self.collapse = collapse  # True for every group, or a set of group names
+        self.diagram = data if isinstance(data, Diagram) else Diagram.from_dict(data)
+        self.components = self.diagram.components
+        self.connections = self.diagram.connections
+        self.groups = self.diagram.groups
         self.dot = Digraph(comment="Tech Diagram", format="png")
-        self.component_dict = {comp["name"]: comp for comp in self.components}
-        self.group_names = [group["name"] for group in self.groups]
-        self.available_images = os.listdir(self.image_directory)
+        self.component_dict = self.diagram.components_by_name
+        self.group_names = self.diagram.groups_by_name  # name -> Group
+        self.image_index = get_image_index(self.image_directory)
+        self.available_images = self.image_index.filenames
         self.group_invisible_nodes = {}  # Map group names to their invisible node IDs
+        self.cluster_names = {}  # Group name -> cluster subgraph name
 
         # Set consistent font attributes
         self.fontname = "Arial"
@@ -23,49 +51,23 @@ class DiagramVisualiser:
         self.fontcolor = "black"
 
     def find_image(self, component):
-        # [Same as before]
-        image_name = component.get("image", "")
-        if image_name and image_name in self.available_images:
+        image_name = self.image_index.match(component)
+        if image_name:
             return os.path.join(self.image_directory, image_name)
-        else:
-            possible_names = [
-                component.get("image", ""),
-                component.get("name", ""),
-                component.get("type", ""),
-            ]
-            names_to_match = set()
-            for name in possible_names:
-                if not name:
-                    continue
-                words = name.lower().replace("-", " ").replace("_", " ").split()
-                names_to_match.update(words)
-            potential_filenames = []
-            for name in names_to_match:
-                potential_filenames.extend(
-                    [f"{name}.png", f"{name}.jpg", f"{name}.svg"]
-                )
-            for filename in potential_filenames:
-                if filename in self.available_images:
-                    return os.path.join(self.image_directory, filename)
-            image_basenames = [
-                os.path.splitext(img)[0].lower() for img in self.available_images
-            ]
-            for name in names_to_match:
-                matches = difflib.get_close_matches(name, image_basenames)
-                if matches:
-                    matched_index = image_basenames.index(matches[0])
-                    matched_image = self.available_images[matched_index]
-                    return os.path.join(self.image_directory, matched_image)
-            return None
+        return None
 
     def create_html_label(self, name, image_path=None):
         # Escape HTML special characters in the name
         name = html.escape(name)
         if image_path:
+            # Icons from a pack built at the cell size need no scaling
+            scale = ' SCALE="TRUE"'
+            if self.image_index.icon_size == ICON_CELL_SIZE:
+                scale = ""
             # Build HTML-like label with image and text
             label = f"""<
 <TABLE BORDER="0" CELLBORDER="0" CELLSPACING="0" CELLPADDING="0">
-    <TR><TD FIXEDSIZE="TRUE" WIDTH="80" HEIGHT="80"><IMG SRC="{image_path}" SCALE="TRUE"/></TD></TR>
+    <TR><TD FIXEDSIZE="TRUE" WIDTH="80" HEIGHT="80"><IMG SRC="{image_path}"{scale}/></TD></TR>
     <TR><TD ALIGN="CENTER"><FONT POINT-SIZE="{self.fontsize}" FACE="{self.fontname}" COLOR="{self.fontcolor}">{name}</FONT></TD></TR>
 </TABLE>
 >"""
@@ -78,16 +80,122 @@ class DiagramVisualiser:
 >"""
         return label
 
-    def render(self, output_filename):
-        # Set default graph attributes for consistency and compact layout
+    def layout_strategy(self, layout=None):
+        """Resolve layout (default: self.layout) for this diagram's size."""
+        collapsed = self.collapsed_groups()
+        if not collapsed:
+            nodes, edges = len(self.components), len(self.connections)
+        else:
+            # Size the layout by what is drawn, not by what is summarised
+            members = self._collapsed_members(collapsed)
+            nodes = len(self.components) - len(members) + len(collapsed)
+            edges = len(
+                {
+                    (members.get(c.source, c.source), members.get(c.target, c.target))
+                    for c in self.connections
+                }
+            )
+        return get_strategy(layout or self.layout, nodes, edges)
+
+    def collapsed_groups(self):
+        """The names of the groups drawn as a single summary node."""
+        if not self.collapse:
+            return set()
+        if self.collapse is True:
+            return set(self.group_names) | {
+                group for group in self.diagram.members if group
+            }
+        return set(self.collapse)
+
+    def _collapsed_members(self, collapsed):
+        # Map each component in a collapsed group to its group's node ID
+        members = self.diagram.members
+        return {
+            comp.name: f"group_invisible_{group}"
+            for group in collapsed
+            for comp in members.get(group, ())
+        }
+
+    def expand_group(self, group_name):
+        """
+        Return a visualiser for one group's components in full detail.
+
+        Connections crossing the group boundary are kept: their far end is
+        redirected to the neighbouring group, drawn collapsed, or to the
+        ungrouped component itself. Rendering the overview with collapse=True
+        and expanding groups on demand lays out a few small graphs instead of
+        one huge one.
+        """
+        members = self.diagram.members.get(group_name, [])
+        if not members and group_name not in self.group_names:
+            raise KeyError(f"Unknown group {group_name!r}")
+        inside = {c.name for c in members} | {group_name}
+
+        # Only the connections touching the group, from the adjacency index
+        touching = {}
+        for name in inside:
+            for conn in self.diagram.connections_of(name):
+                touching[conn.id] = conn
+
+        components = list(members)
+        added = set()
+        neighbours = set()
+        connections = []
+        for _, conn in sorted(touching.items()):
+            ends = []
+            for name in (conn.source, conn.target):
+                component = self.component_dict.get(name)
+                if name in inside:
+                    pass
+                elif component is None:
+                    if name in self.group_names:
+                        neighbours.add(name)
+                elif component.group:
+                    name = component.group
+                    neighbours.add(name)
+                elif name not in added:
+                    added.add(name)
+                    components.append(component)
+                ends.append(name)
+            connections.append(Connection(*ends, conn.label, conn.extra))
+
+        groups = [
+            group
+            for group in self.groups
+            if group.name == group_name or group.name in neighbours
+        ]
+        data = {
+            "groups": [group.to_dict() for group in groups],
+            "components": [component.to_dict() for component in components],
+            "connections": [connection.to_dict() for connection in connections],
+        }
+        return DiagramVisualiser(
+            data,
+            self.image_directory,
+            self.render_cache,
+            self.layout,
+            collapse=neighbours,
+        )
+
+    def build(self, strategy=None):
+        """Populate a fresh Digraph for the diagram and return it."""
+        start = time.perf_counter()
+        match_seconds = 0.0
+        strategy = strategy or self.layout_strategy()
+        collapsed = self.collapsed_groups()
+        collapsed_members = self._collapsed_members(collapsed)
+        self.dot = Digraph(comment="Tech Diagram", format="png")
+        self.group_invisible_nodes = {}
+        self.cluster_names = {}
+
+        # Set default graph attributes for consistency; the strategy picks the
+        # engine, edge routing and (for dot) direction and spacing
         self.dot.attr(
             "graph",
             fontname=self.fontname,
             fontsize=self.fontsize,
             fontcolor=self.fontcolor,
-            nodesep="0.3",  # Reduce horizontal spacing between nodes
-            ranksep="0.5",  # Reduce vertical spacing between nodes
-            splines="ortho",  # Use orthogonal edge routing
+            **strategy.attributes(),
         )
         self.dot.attr(
             "node",
@@ -104,20 +212,16 @@ class DiagramVisualiser:
             penwidth="1.0",
         )
 
-        # Set the layout direction (e.g., left-to-right)
-        self.dot.attr(rankdir="LR")
-
-        # Group components by their group
-        grouped_components = {}
-        for comp in self.components:
-            group = comp.get("group")
-            if group:
-                grouped_components.setdefault(group, []).append(comp)
-            else:
-                grouped_components.setdefault("Ungrouped", []).append(comp)
-
-        # Create subgraphs (clusters) for groups
-        for group_index, (group_name, comps) in enumerate(grouped_components.items()):
+        # Create subgraphs (clusters) for groups, from the model's membership
+        for group_index, (group, comps) in enumerate(self.diagram.members.items()):
+            group_name = group or "Ungrouped"
+            if group_name in collapsed:
+                self._add_summary(group_name, len(comps))
+                continue
+            if not strategy.clusters:
+                match_seconds += self._add_unclustered(group_name, comps)
+                continue
+            self.cluster_names[group_name] = f"cluster_{group_index}"
             with self.dot.subgraph(name=f"cluster_{group_index}") as sub:
                 # Set cluster attributes
                 sub.attr(
@@ -144,27 +248,452 @@ class DiagramVisualiser:
                     self.group_invisible_nodes[group_name] = group_node_id
 
                 for component in comps:
-                    name = component["name"]
+                    name = component.name
+                    match_start = time.perf_counter()
                     image_path = self.find_image(component)
+                    match_seconds += time.perf_counter() - match_start
                     label = self.create_html_label(name, image_path)
                     sub.node(
                         name,
                         label=label,
                     )
 
+        # Collapsed groups without members of their own still need a node
+        # when connections point at them (e.g. neighbours in expand_group)
+        for conn in self.connections:
+            for name in (conn.source, conn.target):
+                if name in collapsed and name not in self.group_invisible_nodes:
+                    self._add_summary(name, 0)
+
         # Add edges
+        merged = {}
         for conn in self.connections:
-            from_node = conn["from"]
-            to_node = conn["to"]
-            label = conn.get("label", "")
+            from_node = conn.source
+            to_node = conn.target
+            label = conn.label or ""
 
             # Check if 'from_node' or 'to_node' is a group
-            if from_node in self.group_names:
+            if from_node in self.group_names or from_node in collapsed:
                 from_node = self.group_invisible_nodes.get(from_node, from_node)
-            if to_node in self.group_names:
+            if to_node in self.group_names or to_node in collapsed:
                 to_node = self.group_invisible_nodes.get(to_node, to_node)
 
-            self.dot.edge(from_node, to_node, label=label)
+            # Edges of collapsed components end at their group's summary node
+            # and are aggregated; edges inside a collapsed group disappear
+            summarised = from_node in collapsed_members or to_node in collapsed_members
+            from_node = collapsed_members.get(from_node, from_node)
+            to_node = collapsed_members.get(to_node, to_node)
+            if summarised and from_node == to_node:
+                continue
+
+            if strategy.merge_edges or summarised:
+                merged.setdefault((from_node, to_node), []).append(label)
+            else:
+                self.dot.edge(from_node, to_node, label=label)
+
+        # Draw parallel edges between the same endpoints once, thicker
+        for (from_node, to_node), labels in merged.items():
+            attrs = {}
+            if len(labels) > 1:
+                attrs["penwidth"] = str(min(1.0 + 0.5 * (len(labels) - 1), 4.0))
+            names = list(dict.fromkeys(label for label in labels if label))
+            if len(names) > 3:
+                label = f"{len(labels)} connections"
+            else:
+                label = ", ".join(names)
+            self.dot.edge(from_node, to_node, label=label, **attrs)
+
+        drawn = len(self.components) - len(collapsed_members)
+        metrics.record("find_image", match_seconds, calls=drawn)
+        metrics.record(
+            "build_dot",
+            time.perf_counter() - start - match_seconds,
+            nodes=drawn + len(collapsed),
+            edges=len(self.connections),
+        )
+        return self.dot
+
+    def _add_summary(self, group_name, count):
+        # One node standing in for a whole group, under its usual node ID
+        group_node_id = f"group_invisible_{group_name}"
+        name = html.escape(group_name)
+        detail = ""
+        if count:
+            noun = "component" if count == 1 else "components"
+            detail = (
+                f'<TR><TD ALIGN="CENTER"><FONT POINT-SIZE="{self.fontsize}" '
+                f'FACE="{self.fontname}" COLOR="gray40">{count} {noun}</FONT>'
+                "</TD></TR>"
+            )
+        label = f"""<
+<TABLE BORDER="1" CELLBORDER="0" CELLSPACING="0" CELLPADDING="6" STYLE="ROUNDED" COLOR="gray">
+    <TR><TD ALIGN="CENTER"><B><FONT POINT-SIZE="{self.fontsize}" FACE="{self.fontname}" COLOR="{self.fontcolor}">{name}</FONT></B></TD></TR>
+    {detail}
+</TABLE>
+>"""
+        self.dot.node(group_node_id, label=label)
+        self.group_invisible_nodes[group_name] = group_node_id
+
+    def _add_unclustered(self, group_name, comps):
+        # Without clusters a group is drawn as a labelled node its components
+        # are invisibly tied to, which keeps them close in force layouts
+        match_seconds = 0.0
+        group_node_id = None
+        if group_name != "Ungrouped":
+            group_node_id = f"group_invisible_{group_name}"
+            self.dot.node(
+                group_node_id,
+                label=html.escape(group_name),
+                shape="box",
+                style="rounded",
+                color="gray",
+            )
+            self.group_invisible_nodes[group_name] = group_node_id
+        for component in comps:
+            name = component.name
+            match_start = time.perf_counter()
+            image_path = self.find_image(component)
+            match_seconds += time.perf_counter() - match_start
+            self.dot.node(name, label=self.create_html_label(name, image_path))
+            if group_node_id:
+                self.dot.edge(group_node_id, name, style="invis")
+        return match_seconds
+
+    def build_pinned(self, saved, strategy=None):
+        """
+        Build the diagram with every node pinned, for neato -n2 to draw.
+
+        Nodes in saved (a SavedLayout) keep their positions and new ones are
+        placed beside their neighbours (see SavedLayout.place); the engine
+        then only routes edges. Returns (Digraph, the SavedLayout used).
+        """
+        strategy = strategy or self.layout_strategy()
+        dot = self.build(strategy)
+        members = self._collapsed_members(self.collapsed_groups())
+        nodes = [c.name for c in self.components if c.name not in members]
+        nodes += self.group_invisible_nodes.values()
+
+        def node_of(name):
+            if name in self.group_invisible_nodes:
+                return self.group_invisible_nodes[name]
+            return members.get(name, name)
+
+        edges = [(node_of(c.source), node_of(c.target)) for c in self.connections]
+        groups = {}
+        for component in self.components:
+            group = component.group or "Ungrouped"
+            if component.name in members:
+                continue
+            if group in self.cluster_names:
+                groups[component.name] = group
+            elif group in self.group_invisible_nodes:
+                # Unclustered groups tie their members to the group node
+                edges.append((self.group_invisible_nodes[group], component.name))
+        for group, node in self.group_invisible_nodes.items():
+            if group in self.cluster_names:
+                groups[node] = group
+
+        layout = saved.place(nodes, edges, groups)
+        layout.strategy = strategy.name
+        dot.attr("graph", layout="neato")
+        for name in nodes:
+            x, y = layout.nodes[name][:2]
+            dot.node(name, pos=f"{x:.2f},{y:.2f}!")
+        for group, cluster in layout.clusters.items():
+            attrs = {"bb": ",".join(f"{n:.2f}" for n in cluster["bb"])}
+            if "lp" in cluster:
+                attrs["lp"] = ",".join(f"{n:.2f}" for n in cluster["lp"])
+            with dot.subgraph(name=self.cluster_names[group]) as sub:
+                sub.attr("graph", **attrs)
+        return dot, layout
+
+    def iter_dot(self, strategy=None):
+        """
+        Yield the diagram's DOT source in chunks from a DotWriter.
+
+        Uses the compact streaming form, without an in-memory Digraph; a
+        diagram with collapsed groups is small and is built as usual instead.
+        """
+        strategy = strategy or self.layout_strategy()
+        if self.collapsed_groups():
+            yield self.build(strategy).source
+            return
+        writer = DotWriter(
+            self.image_directory, strategy, self.fontname, self.fontsize, self.fontcolor
+        )
+        yield from writer.iter_dot(self.components, self.connections, self.groups)
+
+    def write_dot(self, out, layout=None):
+        """Stream the DOT source to a text file object or pipe."""
+        for chunk in self.iter_dot(self.layout_strategy(layout)):
+            out.write(chunk)
+
+    @staticmethod
+    def _saved(chunks, filename):
+        # Pass chunks through while writing them to filename
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filename, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+
+    def render(
+        self,
+        output_filename,
+        view=True,
+        format=None,
+        timeout=None,
+        layout=None,
+        stream=False,
+        embed_icons=False,
+        layout_file=None,
+    ):
+        """
+        Write the DOT source to output_filename and the image beside it.
+
+        Returns the image path. With view=False nothing is opened, and timeout
+        (seconds) bounds the layout engine runs in total. A strategy that runs
+        past its budget falls back to a cheaper one (see layout.py). With a
+        render_cache, unchanged diagrams are copied from the cache instead of
+        being laid out again. stream=True pipes DOT from iter_dot() straight to
+        the engine as it is generated; such renders bypass the render cache.
+        With embed_icons, SVG output carries each distinct icon once, inline.
+        layout_file keeps node positions between renders; see render_formats.
+        """
+        format = format or self.dot.format
+        output_path = self.render_formats(
+            output_filename,
+            [format],
+            timeout,
+            layout,
+            stream,
+            embed_icons,
+            layout_file,
+        )[format]
+        if view:
+            graphviz.view(output_path)
+        return output_path
+
+    def render_formats(
+        self,
+        output_filename,
+        formats=("png", "svg", "pdf"),
+        timeout=None,
+        layout=None,
+        stream=False,
+        embed_icons=False,
+        layout_file=None,
+    ):
+        """
+        Lay the diagram out once and write it in each of formats.
+
+        Returns {format: image path}. A single engine run computes the layout
+        and writes every format from it, so each extra format only costs its
+        output step, not another layout. Otherwise this works like render().
+        With a render_cache, formats already cached are copied and only the
+        rest are rendered.
 
-        # Save and render the graph
-        self.dot.render(output_filename, view=True)
+        With layout_file, node and cluster positions are saved there. When
+        the file already exists, the diagram is not laid out again: saved
+        nodes are pinned where they were, new ones placed beside them, and
+        neato -n2 only routes the edges. That is much faster than a layout
+        and keeps an edited diagram stable. Should it fail, or the file be
+        unreadable, the diagram is laid out from scratch.
+        """
+        formats = list(dict.fromkeys(formats))
+        paths = {format: f"{output_filename}.{format}" for format in formats}
+        saved = None
+        if layout_file is not None and os.path.exists(layout_file):
+            try:
+                saved = SavedLayout.load(layout_file)
+            except (OSError, ValueError, KeyError):
+                pass  # corrupt, truncated or of another format: overwritten
+        with self._render_stage(",".join(formats)) as event:
+            event["pinned"] = False
+            if saved is not None:
+                start = time.monotonic()
+                try:
+                    pinned = self._render_pinned(
+                        saved, layout, output_filename, paths, timeout, event
+                    )
+                    pinned.save(layout_file)
+                    event["pinned"] = True
+                except RenderError:
+                    event["fallbacks"] += 1
+                    if timeout:
+                        timeout = max(timeout - (time.monotonic() - start), 0.0)
+            attempts = () if event["pinned"] else self._attempts(layout, timeout)
+            for strategy, budget, last in attempts:
+                event["layout"] = strategy.name
+                if stream:
+                    source = self._saved(self.iter_dot(strategy), output_filename)
+                else:
+                    source = self.build(strategy).source
+                    self.dot.save(output_filename)
+                try:
+                    self._write_images(
+                        source, paths, budget, event, strategy, layout_file
+                    )
+                except RenderTimeout:
+                    if last:
+                        raise
+                    event["fallbacks"] += 1
+                    continue
+                break
+        if embed_icons and "svg" in paths:
+            with open(paths["svg"], "rb") as f:
+                data = svg_embed.embed_icons(f.read(), imagepath=[self.image_directory])
+            with open(paths["svg"], "wb") as f:
+                f.write(data)
+        return paths
+
+    def _render_pinned(self, saved, layout, output_filename, paths, timeout, event):
+        if saved.strategy in STRATEGIES and layout in (None, "auto"):
+            layout = saved.strategy  # keep the saved look
+        strategy = self.layout_strategy(layout)
+        event["layout"] = strategy.name
+        dot, pinned = self.build_pinned(saved, strategy)
+        dot.save(output_filename)
+        # Half the time, so a full layout can still follow if this fails
+        budget = timeout / 2 if timeout else None
+        self._write_images(
+            dot.source, paths, budget, event, engine="neato", args=["-n2"]
+        )
+        return pinned
+
+    def _write_images(
+        self,
+        source,
+        paths,
+        timeout,
+        event,
+        strategy=None,
+        layout_file=None,
+        engine="dot",
+        args=(),
+    ):
+        # Render source to paths, copying the formats the render cache has.
+        # With layout_file, graphviz's own layout is read back in the same run
+        # and saved there.
+        cache = self.render_cache
+        keys = {}
+        pending = list(paths)
+        if cache is not None and isinstance(source, str):
+            keys = {format: cache.key(source, format) for format in pending}
+            pending = [
+                format
+                for format in pending
+                if not cache.copy_to(keys[format], paths[format])
+            ]
+            if not pending and layout_file is None:
+                event["cache_hit"] = True
+                return
+        outputs = [paths[format] for format in pending]
+        if layout_file is None:
+            run_dot(source, pending, engine, outputs, timeout, args)
+        else:
+            directory = os.path.dirname(os.path.abspath(layout_file))
+            fd, json_path = tempfile.mkstemp(dir=directory, suffix=".json")
+            os.close(fd)
+            try:
+                run_dot(
+                    source,
+                    pending + ["json"],
+                    engine,
+                    outputs + [json_path],
+                    timeout,
+                    args,
+                )
+                with open(json_path, encoding="utf-8") as f:
+                    data = json.load(f)
+            finally:
+                os.remove(json_path)
+            SavedLayout.from_graphviz(data, strategy.name).save(layout_file)
+        for format in pending:
+            if format in keys:
+                cache.put_file(keys[format], paths[format])
+
+    def render_bytes(
+        self,
+        format="png",
+        timeout=None,
+        pool=None,
+        layout=None,
+        stream=False,
+        embed_icons=False,
+    ):
+        """
+        Render the diagram in memory and return the image bytes.
+
+        DOT is piped to the layout engine over stdin and the image read back
+        from stdout, so no files are written. Pass a DotPool to reuse warm
+        engine processes across renders. stream=True pipes DOT from iter_dot()
+        as it is generated, bypassing the render cache and the pool. With
+        embed_icons, SVG output carries each distinct icon once, inline.
+        """
+        data = self._render_bytes(format, timeout, pool, layout, stream)
+        if embed_icons and format == "svg":
+            data = svg_embed.embed_icons(data, imagepath=[self.image_directory])
+        return data
+
+    def _render_bytes(self, format, timeout, pool, layout, stream):
+        with self._render_stage(format) as event:
+            for strategy, budget, last in self._attempts(layout, timeout):
+                event["layout"] = strategy.name
+                if stream:
+                    try:
+                        return run_dot(self.iter_dot(strategy), format, timeout=budget)
+                    except RenderTimeout:
+                        if last:
+                            raise
+                        event["fallbacks"] += 1
+                        continue
+                source = self.build(strategy).source
+                cache = self.render_cache
+                key = cache.key(source, format) if cache is not None else None
+                if key is not None:
+                    data = cache.get_bytes(key)
+                    if data is not None:
+                        event["cache_hit"] = True
+                        return data
+                try:
+                    if pool is not None:
+                        data = pool.render(source, format, timeout=budget)
+                    else:
+                        data = run_dot(source, format, timeout=budget)
+                except RenderTimeout:
+                    if last:
+                        raise
+                    event["fallbacks"] += 1
+                    continue
+                if key is not None:
+                    cache.put_bytes(key, data)
+                return data
+
+    def _attempts(self, layout, timeout):
+        # Yield (strategy, seconds allowed, is last) down the fallback chain.
+        # Earlier strategies get at most half of what is left of timeout, so
+        # the cheapest one always has time to finish.
+        chain = fallback_chain(self.layout_strategy(layout))
+        deadline = time.monotonic() + timeout if timeout else None
+        for index, strategy in enumerate(chain):
+            last = index == len(chain) - 1
+            budget = None if last else strategy.budget
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0.0)
+                if not last:
+                    remaining /= 2
+                budget = remaining if budget is None else min(budget, remaining)
+            yield strategy, budget, last
+
+    def _render_stage(self, format):
+        return metrics.stage(
+            "render",
+            format=format,
+            cache_hit=False,
+            fallbacks=0,
+            nodes=len(self.components),
+            edges=len(self.connections),
+        )
@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from ai_architect.engine import RenderError, run_dot
+from ai_architect.generator import DiagramGenerator
+from ai_architect.image_index import ImageIndex
+from ai_architect.parser import parse_diagram
+from ai_architect.render import COLD_START_TARGET
+from ai_architect.visualiser import DiagramVisualiser
+
+PROVIDERS = ["aws", "azure", "gcp", "oci", "ibm"]
+SERVICES = (
+    "lambda s3 redshift ec2 sql database api gateway queue kafka storage blob "
+    "function step synapse dbt cache redis postgres mysql cdn monitor search etl"
+).split()
+TYPES = (
+    "serverless_function object_storage data_warehouse database api_management "
+    "message_queue cache monitoring_service role"
+).split()
+SOURCE_ICON = os.path.join("images", "api.png")
+
+
+class MockOpenAI:
+    """Stands in for the OpenAI client, replaying one canned completion."""
+
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(role="assistant", content=self.content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(index=0, message=message)],
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0),
+        )
+
+
+def synthetic_catalog(directory, size, seed=0):
+    """Fill directory with `size` icon files named like a real icon library."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    names = set()
+    while len(names) < size:
+        parts = [rng.choice(PROVIDERS)] if rng.random() < 0.7 else []
+        parts += rng.sample(SERVICES, rng.randint(1, 2))
+        name = "-".join(parts)
+        if name in names:
+            name = f"{name}-{len(names)}"
+        names.add(name)
+    for name in sorted(names):
+        shutil.copyfile(SOURCE_ICON, os.path.join(directory, f"{name}.png"))
+    return sorted(f"{name}.png" for name in names)
+
+
+def synthetic_diagram(components, edge_density, groups, catalog, seed=0):
+    """
+    Build a diagram in the generator's JSON schema.
+
+    edge_density is connections per component. A third of the image names are
+    mangled so find_image exercises its token and fuzzy fallbacks.
+    """
+    rng = random.Random(seed)
+    group_names = [f"Group {i}" for i in range(groups)]
+    diagram = {
+        "groups": [{"name": name, "type": "cloud_provider"} for name in group_names],
+        "components": [],
+        "connections": [],
+    }
+    for i in range(components):
+        image = rng.choice(catalog)
+        roll = rng.random()
+        if roll < 0.15:
+            image = image.replace("-", "_").replace(".png", "s.png")
+        elif roll < 0.33:
+            image = f"{rng.choice(SERVICES)}-{rng.choice(SERVICES)}x.png"
+        component = {
+            "name": f"{rng.choice(SERVICES).title()} {i}",
+            "type": rng.choice(TYPES),
+            "image": image,
+        }
+        if group_names and rng.random() < 0.9:
+            component["group"] = rng.choice(group_names)
+        diagram["components"].append(component)
+
+    names = [component["name"] for component in diagram["components"]]
+    for _ in range(int(components * edge_density)):
+        source, target = rng.choice(names), rng.choice(names + group_names)
+        diagram["connections"].append(
+            {"from": source, "to": target, "label": rng.choice(["reads", "writes"])}
+        )
+    return diagram
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times; return (median seconds, last result)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def run_case(components, args, workdir):
+    catalog_dir = os.path.join(workdir, f"catalog-{args.catalog}")
+    if not os.path.isdir(catalog_dir):
+        synthetic_catalog(catalog_dir, args.catalog, args.seed)
+    catalog = sorted(os.listdir(catalog_dir))
+    diagram = synthetic_diagram(
+        components, args.density, args.groups, catalog, args.seed
+    )
+    response = "Here is the diagram:\n" + json.dumps(diagram, indent=2)
+    stages = {}
+
+    generator = DiagramGenerator(
+        client=MockOpenAI(response), image_directory=catalog_dir
+    )
+    stages["generate"], text = timed(
+        lambda: generator.generate_diagram("A synthetic estate"), args.repeat
+    )
+    stages["parse"], parsed = timed(lambda: parse_diagram(text), args.repeat)
+    stages["index"], _ = timed(lambda: ImageIndex(catalog_dir), args.repeat)
+
+    def find_images():
+        # A fresh index per run so memoised matches do not hide the cost
+        visualiser = DiagramVisualiser(parsed, catalog_dir)
+        visualiser.image_index = ImageIndex(catalog_dir)
+        return [visualiser.find_image(c) for c in visualiser.components]
+
+    stages["find_image"], _ = timed(find_images, args.repeat)
+
+    visualiser = DiagramVisualiser(parsed, catalog_dir)
+    stages["build_dot"], dot = timed(visualiser.build, args.repeat)
+
+    layout_error = None
+    if args.skip_layout or components > args.max_layout_nodes:
+        stages["layout"] = None
+    else:
+        try:
+            stages["layout"], _ = timed(
+                lambda: run_dot(dot.source, "dot", timeout=args.layout_timeout), 1
+            )
+        except RenderError as e:
+            stages["layout"] = None
+            layout_error = str(e)
+
+    return {
+        "components": components,
+        "connections": len(diagram["connections"]),
+        "groups": args.groups,
+        "catalog": args.catalog,
+        "dot_bytes": len(dot.source),
+        "stages": stages,
+        "layout_error": layout_error,
+    }
+
+
+def cold_start(repeat):
+    """
+    Time importing the render CLI in fresh interpreters.
+
+    Returns the median seconds over a bare interpreter start, and whether the
+    import pulled in the openai SDK.
+    """
+    check = "import sys, ai_architect.render; print('openai' in sys.modules)"
+
+    def run(statement):
+        return subprocess.run(
+            [sys.executable, "-c", statement],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    bare, _ = timed(lambda: run("pass"), repeat)
+    render, loaded = timed(lambda: run(check), repeat)
+    return {
+        "seconds": max(0.0, render - bare),
+        "interpreter_seconds": bare,
+        "target": COLD_START_TARGET,
+        "openai_loaded": loaded == "True",
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {case["components"]: case for case in baseline["cases"]}
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for case in current["cases"]:
+        old = previous.get(case["components"])
+        if not old:
+            continue
+        ratios = []
+        for stage, seconds in case["stages"].items():
+            before = old["stages"].get(stage)
+            if seconds and before:
+                ratios.append(f"{stage} x{seconds / before:.2f}")
+        print(f"  {case['components']:>6} components: {', '.join(ratios)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time each pipeline stage on synthetic diagrams, offline."
+    )
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    parser.add_argument("--density", type=float, default=1.5)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--catalog", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-layout", action="store_true")
+    parser.add_argument("--max-layout-nodes", type=int, default=1000)
+    parser.add_argument("--layout-timeout", type=float, default=120)
+    parser.add_argument("--skip-cold-start", action="store_true")
+    parser.add_argument("-o", "--output", default="benchmark.json")
+    parser.add_argument("--compare", help="Earlier benchmark JSON to compare with")
+    args = parser.parse_args()
+
+    result = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": vars(args),
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(s) for s in args.sizes.split(",")):
+            case = run_case(size, args, workdir)
+            result["cases"].append(case)
+            stages = ", ".join(
+                f"{name} {seconds * 1000:.1f}ms"
+                for name, seconds in case["stages"].items()
+                if seconds is not None
+            )
+            print(f"{size:>6} components: {stages}")
+
+    if not args.skip_cold_start:
+        result["cold_start"] = start = cold_start(max(args.repeat, 5))
+        verdict = "ok" if start["seconds"] <= start["target"] else "OVER TARGET"
+        print(
+            f"Render CLI cold start: {start['seconds'] * 1000:.0f}ms over the "
+            f"interpreter (target {start['target'] * 1000:.0f}ms, {verdict}), "
+            f"openai {'loaded' if start['openai_loaded'] else 'not loaded'}"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
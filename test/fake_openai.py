@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_DIAGRAM = {
+    "groups": [{"name": "AWS", "type": "cloud_provider"}],
+    "components": [
+        {"name": "Client", "type": "role", "image": "user.png"},
+        {"name": "API", "type": "api", "group": "AWS", "image": "api.png"},
+        {
+            "name": "Lambda",
+            "type": "serverless_function",
+            "group": "AWS",
+            "image": "aws-lambda.png",
+        },
+    ],
+    "connections": [
+        {"from": "Client", "to": "API", "label": "requests"},
+        {"from": "API", "to": "Lambda", "label": "invokes"},
+    ],
+}
+
+
+class FakeOpenAI:
+    """
+    Local stand-in for the chat completions endpoint.
+
+    Every request is answered with `content` after `latency` seconds. The first
+    `fail_first` requests get a 429 instead, so retry paths can be exercised.
+    Point a client at `base_url` to use it.
+    """
+
+    def __init__(self, content=None, latency=0.0, fail_first=0, port=0):
+        self.content = content if content is not None else json.dumps(SAMPLE_DIAGRAM)
+        self.latency = latency
+        self.fail_first = fail_first
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, body):
+        """Return (status, payload) for one chat completion request body."""
+        with self._lock:
+            self.requests.append(body)
+            failing = len(self.requests) <= self.fail_first
+        if failing:
+            return 429, {"error": {"message": "Rate limit reached", "type": "requests"}}
+        time.sleep(self.latency)
+        return 200, {
+            "id": f"chatcmpl-fake-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": sum(
+                    len(m.get("content", "")) // 4 for m in body.get("messages", [])
+                ),
+                "completion_tokens": len(self.content) // 4,
+                "total_tokens": 0,
+            },
+        }
+
+    def stream_chunks(self, payload, size=16):
+        """Split a completion payload into chat.completion.chunk objects."""
+        content = payload["choices"][0]["message"]["content"]
+        pieces = [content[i : i + size] for i in range(0, len(content), size)]
+        for index, piece in enumerate(pieces):
+            yield {
+                "id": payload["id"],
+                "object": "chat.completion.chunk",
+                "created": payload["created"],
+                "model": payload["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": piece},
+                        "finish_reason": "stop" if index == len(pieces) - 1 else None,
+                    }
+                ],
+            }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                status, payload = fake.respond(body)
+                if status == 200 and body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    for chunk in fake.stream_chunks(payload):
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    return
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+async def run_batch(base_url, count):
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from ai_architect.batch import BatchGenerator
+    from ai_architect.generator import DiagramGenerator
+
+    batch = BatchGenerator(
+        generator=DiagramGenerator(),
+        base_url=base_url,
+        concurrency=4,
+        requests_per_second=20,
+    )
+    descriptions = [f"Serverless API number {i}" for i in range(count)]
+    async for result in batch.generate_many(descriptions):
+        print(result)
+
+
+def main():
+    with FakeOpenAI(latency=0.1, fail_first=2) as fake:
+        start = time.perf_counter()
+        asyncio.run(run_batch(fake.base_url, 12))
+        print(
+            f"{len(fake.requests)} requests served in "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
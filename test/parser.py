@@ -0,0 +1,60 @@
+import json
+
+from ai_architect.chunked import merge_diagrams
+from ai_architect.parser import DiagramError, parse_diagram, validate_diagram
+
+VALID = {
+    "groups": [{"name": "AWS", "type": "cloud_provider"}],
+    "components": [
+        {"name": "API", "type": "api", "group": "AWS"},
+        {"name": "DB", "type": "database", "group": "AWS"},
+    ],
+    "connections": [{"from": "API", "to": "DB", "label": "reads"}],
+}
+
+# Values a model might put where a name belongs; each must be reported as an
+# issue at its path, never raise
+WRONG_TYPES = {
+    "/groups/0/name": ["AWS"],
+    "/components/0/name": ["API"],
+    "/components/1/group": {"name": "AWS"},
+    "/connections/0/from": ["API"],
+    "/connections/0/to": 3,
+}
+
+
+def with_value(path, value):
+    diagram = json.loads(json.dumps(VALID))
+    *parents, key = path.strip("/").split("/")
+    node = diagram
+    for part in parents:
+        node = node[int(part)] if isinstance(node, list) else node[part]
+    node[key] = value
+    return diagram
+
+
+def main():
+    assert validate_diagram(VALID) == []
+
+    for path, value in WRONG_TYPES.items():
+        diagram = with_value(path, value)
+        issues = validate_diagram(diagram)
+        assert any(issue.path == path for issue in issues), (path, issues)
+        try:
+            parse_diagram(json.dumps(diagram))
+        except DiagramError as e:
+            print(f"{path} = {value!r}: {e.issues[0]}")
+        else:
+            raise AssertionError(f"{path} = {value!r} was accepted")
+    print(f"{len(WRONG_TYPES)} wrong-typed names reported")
+
+    # Merging sections with such values must not raise either; here every
+    # value is valid in some other section
+    parts = [with_value(path, value) for path, value in WRONG_TYPES.items()]
+    merged, report = merge_diagrams(parts)
+    assert validate_diagram(merged) == [], validate_diagram(merged)
+    print(f"merged {len(parts)} sections with wrong-typed names: {report}")
+
+
+if __name__ == "__main__":
+    main()
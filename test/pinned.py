@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+
+from ai_architect.pinned import SavedLayout
+from ai_architect.visualiser import DiagramVisualiser
+
+# Two clusters side by side, as graphviz would report them
+SAVED = SavedLayout(
+    {
+        "A": [50.0, 50.0, 86.4, 104.4],
+        "B": [200.0, 50.0, 86.4, 104.4],
+    },
+    {
+        "G1": {"bb": [0.0, -10.0, 100.0, 120.0], "lp": [50.0, 110.0]},
+        "G2": {"bb": [150.0, -10.0, 250.0, 120.0], "lp": [200.0, 110.0]},
+    },
+    "spline",
+)
+
+NODES = ["A", "B", "C", "D", "E", "F"]
+EDGES = [("A", "C"), ("B", "D"), ("C", "D"), ("E", "A"), ("F", "B")]
+GROUPS = {"A": "G1", "B": "G2", "C": "G1", "D": "G2", "E": "G3", "F": "G3"}
+
+
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def node_box(box):
+    x, y, width, height = box
+    return [x - width / 2, y - height / 2, x + width / 2, y + height / 2]
+
+
+def check_place():
+    layout = SAVED.place(NODES, EDGES, GROUPS)
+    assert set(layout.nodes) == set(NODES)
+    for name, box in SAVED.nodes.items():
+        assert layout.nodes[name] == box, f"{name} moved"
+
+    boxes = [node_box(box) for box in layout.nodes.values()]
+    for i, box in enumerate(boxes):
+        for other in boxes[i + 1 :]:
+            assert not overlaps(box, other), "nodes overlap"
+
+    clusters = list(layout.clusters.items())
+    for i, (group, cluster) in enumerate(clusters):
+        for other, other_cluster in clusters[i + 1 :]:
+            assert not overlaps(cluster["bb"], other_cluster["bb"]), (group, other)
+        x1, y1, x2, y2 = cluster["bb"]
+        for name, box in layout.nodes.items():
+            if GROUPS[name] == group:
+                left, bottom, right, top = node_box(box)
+                inside = x1 <= left and right <= x2 and y1 <= bottom and top <= y2
+                assert inside, f"{name} outside {group}"
+
+    # Placing again from the result moves nothing
+    again = layout.place(NODES, EDGES, GROUPS)
+    assert again.nodes == layout.nodes
+    assert again.clusters == layout.clusters
+    print(f"placed {len(NODES) - len(SAVED.nodes)} new nodes, stable")
+    return layout
+
+
+def check_files(layout):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "layout.json")
+        layout.save(path)
+        loaded = SavedLayout.load(path)
+        assert loaded.nodes == layout.nodes
+        assert loaded.clusters == layout.clusters
+        assert loaded.strategy == "spline"
+
+        for content in (
+            "{",
+            "[]",
+            '{"nodes": {}}',
+            '{"nodes": {"A": [1]}, "clusters": {}}',
+        ):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+            try:
+                SavedLayout.load(path)
+            except (ValueError, KeyError):
+                pass
+            else:
+                raise AssertionError(f"{content!r} loaded")
+    print("save/load round trip, bad files rejected")
+
+
+def check_build_pinned():
+    diagram = {
+        "groups": [{"name": "G1"}],
+        "components": [
+            {"name": "A", "group": "G1"},
+            {"name": "C", "group": "G1"},
+            {"name": "Z"},
+        ],
+        "connections": [{"from": "A", "to": "C"}, {"from": "C", "to": "Z"}],
+    }
+    visualiser = DiagramVisualiser(diagram, "images", layout="spline")
+    dot, layout = visualiser.build_pinned(SAVED)
+    assert layout.nodes["A"] == SAVED.nodes["A"]
+    assert 'A [pos="50.00,50.00!"]' in dot.source
+    assert "layout=neato" in dot.source
+    print(json.dumps({name: box[:2] for name, box in layout.nodes.items()}))
+
+
+def main():
+    check_files(check_place())
+    check_build_pinned()
+
+
+if __name__ == "__main__":
+    main()
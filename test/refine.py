@@ -0,0 +1,59 @@
+from ai_architect.refine import PatchError, apply_patch
+
+DIAGRAM = {
+    "groups": [{"name": "AWS", "type": "cloud_provider"}],
+    "components": [
+        {"name": "A", "type": "api", "group": "AWS"},
+        {"name": "B", "type": "database", "group": "AWS"},
+    ],
+    "connections": [{"from": "A", "to": "B", "label": "reads"}],
+}
+
+# Malformed patches a model might send; each must fail with PatchError
+MALFORMED = [
+    [{"op": "replace", "path": "/components/name=A&x/type", "value": "db"}],
+    [{"op": "add", "path": "/components/0/name/x", "value": "y"}],
+    [{"op": "remove", "path": "/components/0/name/x"}],
+    [{"op": "replace", "path": "/components/0/name/x", "value": "y"}],
+    [{"op": "test", "path": "/components/0/name/0", "value": "A"}],
+    [{"op": "copy", "from": "/components/0/name/0", "path": "/groups/-"}],
+    [{"op": "move", "from": "/groups/0", "path": "/components/1/type/x"}],
+    [{"op": "remove", "path": "/connections/from=A&to"}],
+    [{"op": "remove", "path": "/components/7"}],
+    [{"op": "move", "path": "/groups/-"}],
+    [{"op": "move", "path": "/connections/0"}],
+    [{"op": "copy", "from": 3, "path": "/groups/-"}],
+    [{"op": "move", "from": "", "path": "/groups/-"}],
+    [{"op": "add", "path": None, "value": 1}],
+    [{"op": "remove", "path": ["components", 0]}],
+    [{"op": "jump", "path": "/components/0"}],
+    ["not an operation"],
+]
+
+
+def main():
+    patched = apply_patch(
+        DIAGRAM,
+        [
+            {"op": "replace", "path": "/components/name=A/type", "value": "gateway"},
+            {"op": "remove", "path": "/connections/from=A&to=B"},
+            {"op": "add", "path": "/components/-", "value": {"name": "C"}},
+        ],
+    )
+    assert patched["components"][0]["type"] == "gateway"
+    assert patched["connections"] == []
+    assert patched["components"][-1] == {"name": "C"}
+    assert DIAGRAM["connections"], "the input must not be changed"
+
+    for operations in MALFORMED:
+        try:
+            apply_patch(DIAGRAM, operations)
+        except PatchError as e:
+            print(f"PatchError: {e}")
+        else:
+            raise AssertionError(f"{operations!r} was applied")
+    print(f"{len(MALFORMED)} malformed patches rejected")
+
+
+if __name__ == "__main__":
+    main()
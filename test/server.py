@@ -0,0 +1,109 @@
+import json
+import os
+import socket
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from test.fake_openai import SAMPLE_DIAGRAM, FakeOpenAI
+
+
+def post(base_url, path, payload):
+    request = urllib.request.Request(
+        base_url + path,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return response.headers["Content-Type"], response.read()
+
+
+def status(base_url, path, payload):
+    try:
+        post(base_url, path, payload)
+    except urllib.error.HTTPError as e:
+        return e.code
+    return 200
+
+
+def raw_status(host, port, content_length):
+    # A request whose body is never sent: the server must answer at once and
+    # close the connection rather than wait for the body
+    with socket.create_connection((host, port), timeout=10) as sock:
+        sock.sendall(
+            b"POST /generate HTTP/1.1\r\nHost: test\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n" % content_length
+        )
+        response = b""
+        while chunk := sock.recv(4096):
+            response += chunk
+    head = response.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+    assert "Connection: close" in head, head
+    return int(head.split()[1])
+
+
+def main():
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from openai import APIConnectionError, OpenAI
+
+    from ai_architect.generator import DiagramGenerator
+    from ai_architect.server import MAX_BODY, DiagramServer, DiagramService
+
+    with FakeOpenAI(latency=0.5) as fake:
+        client = OpenAI(api_key="fake", base_url=fake.base_url)
+        service = DiagramService(DiagramGenerator(client=client), max_renders=2)
+        server = DiagramServer(("127.0.0.1", 0), service)
+        host, port = server.server_address[:2]
+        base_url = f"http://{host}:{port}"
+        with ThreadPoolExecutor(max_workers=9) as pool:
+            pool.submit(server.serve_forever)
+            try:
+                start = time.perf_counter()
+                payload = {"description": "Serverless API", "format": "svg"}
+                results = list(
+                    pool.map(
+                        lambda _: post(base_url, "/generate-render", payload),
+                        range(8),
+                    )
+                )
+                print(
+                    f"{len(results)} identical requests in "
+                    f"{time.perf_counter() - start:.2f}s, "
+                    f"{len(fake.requests)} model call(s)"
+                )
+                assert len(fake.requests) == 1
+                assert len({data for _, data in results}) == 1
+
+                content_type, data = post(base_url, "/generate", payload)
+                print(f"/generate: {content_type}, {len(json.loads(data))} sections")
+                content_type, data = post(
+                    base_url, "/render", {"diagram": SAMPLE_DIAGRAM}
+                )
+                print(f"/render: {content_type}, {len(data)} bytes")
+
+                # A model API failure is a bad gateway; a bug is an error here
+                def api_down(description):
+                    raise APIConnectionError("connection refused")
+
+                def bug(description):
+                    return {}["missing"]
+
+                for length, expected in ((-1, 400), (MAX_BODY + 1, 413)):
+                    code = raw_status(host, port, length)
+                    print(f"Content-Length {length}: {code}")
+                    assert code == expected
+
+                for generate, expected in ((api_down, 502), (bug, 500)):
+                    service.generate = generate
+                    code = status(base_url, "/generate", {"description": "x"})
+                    print(f"{generate.__name__}: {code}")
+                    assert code == expected
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import tempfile
+
+from ai_architect import svg_embed
+from ai_architect.dot_writer import DotWriter
+
+IMAGES = "images"
+
+# What graphviz writes for an HTML-label icon (a path from the working
+# directory) and for a streamed image= icon (a bare name found on imagepath)
+SVG = b"""<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg width="200pt" height="100pt" xmlns="http://www.w3.org/2000/svg">
+<g id="node1" class="node">
+<image xlink:href="images/api.png" width="80px" height="80px" x="10" y="10" \
+preserveAspectRatio="xMinYMin meet"/>
+</g>
+<g id="node2" class="node">
+<image xlink:href="api.png" width="86px" height="80px" x="110" y="10" \
+preserveAspectRatio="xMidYMid meet"/>
+</g>
+<g id="node3" class="node">
+<image xlink:href="api.png" width="86px" height="80px" x="110" y="60" \
+preserveAspectRatio="xMidYMid meet"/>
+</g>
+</svg>
+"""
+
+
+def main():
+    # The streamed writer refers to icons by bare filename
+    dot = "".join(DotWriter(IMAGES, "spline").iter_dot([{"name": "api"}], []))
+    assert 'image="api.png"' in dot, dot
+
+    data = svg_embed.embed_icons(SVG, imagepath=[IMAGES])
+    assert b'<image xlink:href="api.png"' not in data
+    assert b'<image xlink:href="images/api.png"' not in data
+    assert data.count(b"<symbol") == 2, data  # one per distinct href
+    assert data.count(b"<use ") == 3
+    print(f"embedded {len(SVG)} -> {len(data)} bytes")
+
+    # Without the image directory, bare names are left as links
+    with tempfile.TemporaryDirectory() as directory:
+        data = svg_embed.embed_icons(SVG, base_directory=directory)
+    assert data.count(b"<use ") == 0
+    print("unresolvable icons left as links")
+
+
+if __name__ == "__main__":
+    main()
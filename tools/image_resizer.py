@@ -1,8 +1,22 @@
 # image_resizer.py
 
+import argparse
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 from PIL import Image
 
+# Written to the output directory; records what each output was made from.
+# ai_architect.image_index reads it to recognise an icon pack.
+MANIFEST_NAME = ".resize-manifest.json"
+
+# DiagramVisualiser's icon cell; icons resized to it are drawn without scaling
+ICON_PACK_SIZE = (80, 80)
+
 
 def resize_image(img, size):
     """Resize an image while maintaining aspect ratio and adding padding if necessary."""
@@ -13,36 +27,199 @@ def resize_image(img, size):
     return background
 
 
-def resize_images(directory, size=(64, 64)):
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def process_image(source_path, output_path, size):
+    """
+    Write source_path to output_path as a size RGBA PNG.
+
+    Returns "copied" when the source already is one, "resized" otherwise. The
+    output is written to a temporary file first, so an interrupted run never
+    leaves a truncated icon behind.
+    """
+    directory = os.path.dirname(output_path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        with Image.open(source_path) as img:
+            if img.format == "PNG" and img.mode == "RGBA" and img.size == size:
+                status = "copied"
+                shutil.copyfile(source_path, tmp_path)
+            else:
+                status = "resized"
+                # Convert to RGBA if the image is not already in that mode
+                if img.mode != "RGBA":
+                    img = img.convert("RGBA")
+                resize_image(img, size).save(tmp_path, "PNG")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return status
+
+
+def _load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def resize_images(
+    directory,
+    size=(64, 64),
+    output_directory=None,
+    workers=None,
+    dry_run=False,
+    force=False,
+):
     """
     Resize all PNG images in the specified directory to the given size.
 
+    Results go to output_directory (default "<directory>-<w>x<h>"); the
+    originals are never modified. A manifest there records each source's
+    stat, content hash and target size, so a re-run only processes icons
+    that were added or changed (or all of them with force). Outputs whose
+    source was deleted are removed. With dry_run nothing is written and the
+    plan is returned.
+
     :param directory: Path to the directory containing images
     :param size: Tuple of (width, height) for the target size
+    :return: dict of filename lists: resized, copied, skipped, removed, failed
     """
-    for filename in os.listdir(directory):
-        if filename.lower().endswith(".png"):
-            file_path = os.path.join(directory, filename)
-            try:
-                with Image.open(file_path) as img:
-                    # Convert to RGBA if the image is not already in that mode
-                    if img.mode != "RGBA":
-                        img = img.convert("RGBA")
+    size = tuple(size)
+    directory = directory.rstrip("/\\") or directory
+    if output_directory is None:
+        output_directory = f"{directory}-{size[0]}x{size[1]}"
+    if os.path.realpath(output_directory) == os.path.realpath(directory):
+        raise ValueError("output_directory must differ from the source directory")
+
+    manifest_path = os.path.join(output_directory, MANIFEST_NAME)
+    # Read even with force: it still says which outputs have lost their source
+    manifest = _load_manifest(manifest_path)
+    summary = {"resized": [], "copied": [], "skipped": [], "removed": [], "failed": []}
+
+    pending = {}
+    sources = set()
+    for entry in os.scandir(directory):
+        if not (entry.is_file() and entry.name.lower().endswith(".png")):
+            continue
+        filename = entry.name
+        sources.add(filename)
+        stat = entry.stat()
+        output_path = os.path.join(output_directory, filename)
+        record = None if force else manifest.get(filename)
+        if record and record["size"] == list(size) and os.path.exists(output_path):
+            # Unchanged stat means unchanged file; otherwise confirm by content
+            stat_key = [stat.st_mtime_ns, stat.st_size]
+            if [record["mtime_ns"], record["bytes"]] == stat_key:
+                summary["skipped"].append(filename)
+                continue
+            digest = file_hash(entry.path)
+            if digest == record["sha256"]:
+                record["mtime_ns"], record["bytes"] = stat.st_mtime_ns, stat.st_size
+                summary["skipped"].append(filename)
+                continue
+        else:
+            digest = file_hash(entry.path)
+        pending[filename] = {
+            "sha256": digest,
+            "size": list(size),
+            "mtime_ns": stat.st_mtime_ns,
+            "bytes": stat.st_size,
+        }
+
+    removed = sorted(name for name in manifest if name not in sources)
+    summary["removed"] = removed
+    if dry_run:
+        summary["resized"] = sorted(pending)
+        return summary
+
+    os.makedirs(output_directory, exist_ok=True)
+    for filename in removed:
+        manifest.pop(filename)
+        try:
+            os.remove(os.path.join(output_directory, filename))
+        except FileNotFoundError:
+            pass
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                filename: pool.submit(
+                    process_image,
+                    os.path.join(directory, filename),
+                    os.path.join(output_directory, filename),
+                    size,
+                )
+                for filename in sorted(pending)
+            }
+            for filename, future in futures.items():
+                try:
+                    summary[future.result()].append(filename)
+                    manifest[filename] = pending[filename]
+                except Exception as e:
+                    manifest.pop(filename, None)
+                    summary["failed"].append(filename)
+                    print(f"Error processing {filename}: {str(e)}")
+
+    fd, tmp_path = tempfile.mkstemp(dir=output_directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return summary
 
-                    new_img = resize_image(img, size)
-                    new_img.save(file_path, "PNG")
 
-                print(f"Resized {filename}")
-            except Exception as e:
-                print(f"Error processing {filename}: {str(e)}")
+def _parse_size(value):
+    width, _, height = value.lower().partition("x")
+    return (int(width), int(height or width))
 
 
 def main():
-    image_directory = "./images"  # Change this to your image directory path
-    target_size = (64, 64)  # Change this if you want a different size
+    parser = argparse.ArgumentParser(
+        description="Resize icons into a separate directory, skipping unchanged ones."
+    )
+    parser.add_argument("directory", nargs="?", default="./images")
+    parser.add_argument("-o", "--output-dir", help="Default: <directory>-<w>x<h>")
+    parser.add_argument("-s", "--size", type=_parse_size, default=(64, 64))
+    parser.add_argument(
+        "--pack",
+        action="store_const",
+        const=ICON_PACK_SIZE,
+        dest="size",
+        help="Build a render-ready icon pack at the diagram cell size",
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("-n", "--dry-run", action="store_true")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest")
+    args = parser.parse_args()
 
-    resize_images(image_directory, target_size)
-    print("Image resizing completed.")
+    summary = resize_images(
+        args.directory,
+        args.size,
+        output_directory=args.output_dir,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        force=args.force,
+    )
+    verb = "Would resize" if args.dry_run else "Resized"
+    for filename in summary["resized"]:
+        print(f"{verb} {filename}")
+    for filename in summary["removed"]:
+        print(f"{'Would remove' if args.dry_run else 'Removed'} {filename}")
+    print(
+        f"Image resizing {'planned' if args.dry_run else 'completed'}: "
+        f"{len(summary['resized'])} resized, {len(summary['copied'])} copied, "
+        f"{len(summary['skipped'])} unchanged, {len(summary['removed'])} removed, "
+        f"{len(summary['failed'])} failed."
+    )
 
 
 if __name__ == "__main__":